@@ -58,6 +58,9 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
   
   const socketRef = useRef<WebSocket | null>(null);
   const reconnectTimerRef = useRef<number | null>(null);
+  // Resumable session: missed events are replayed on reconnect
+  const resumeTokenRef = useRef<string | null>(null);
+  const lastSeqRef = useRef<number>(0);
 
   // Set up WebSocket connection
   const setupWebSocket = useCallback(() => {
@@ -69,7 +72,11 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
       return;
     }
 
-    const ws = new WebSocket(`${WS_URL}/ws?token=${encodeURIComponent(token)}`);
+    let url = `${WS_URL}/ws?token=${encodeURIComponent(token)}`;
+    if (resumeTokenRef.current) {
+      url += `&resume=${encodeURIComponent(resumeTokenRef.current)}&lastSeq=${lastSeqRef.current}`;
+    }
+    const ws = new WebSocket(url);
     
     ws.onopen = () => {
       console.log('WebSocket connected');
@@ -92,17 +99,37 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
     
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data);
+      if (typeof data.seq === 'number') {
+        lastSeqRef.current = data.seq;
+      }
       
       switch (data.type) {
+        case 'session':
+          if (data.resumeToken !== resumeTokenRef.current) {
+            resumeTokenRef.current = data.resumeToken;
+            lastSeqRef.current = data.lastSeq;
+          }
+          break;
+        case 'resync_required':
+          fetchChats();
+          break;
         case 'message':
           handleNewMessage(data.message);
           break;
         case 'status':
           handleStatusUpdate(data.userId, data.isOnline);
           break;
+        case 'presence':
+          data.updates.forEach((update: { userId: number; isOnline: boolean }) =>
+            handleStatusUpdate(update.userId, update.isOnline)
+          );
+          break;
         case 'chat_created':
           fetchChats();
           break;
+        case 'message_failed':
+          console.error('Message could not be sent:', data.detail);
+          break;
         case 'user_typing':
           // Handle typing indicator (could be implemented later)
           break;
@@ -283,7 +310,7 @@ export const ChatProvider: React.FC<{ children: React.ReactNode }> = ({ children
   const handleStatusUpdate = (userId: number, isOnline: boolean) => {
     // Update online users list
     if (isOnline) {
-      setOnlineUsers(prev => [...prev, userId]);
+      setOnlineUsers(prev => prev.includes(userId) ? prev : [...prev, userId]);
     } else {
       setOnlineUsers(prev => prev.filter(id => id !== userId));
     }
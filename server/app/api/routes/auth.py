@@ -3,16 +3,19 @@ import logging
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.core.auth import (
     authenticate_user, 
     create_access_token, 
-    get_password_hash,
     get_current_user
 )
 from app.core.config import settings
-from app.db.database import get_db
+from app.core.passwords import password_hasher
+from app.core.user_search import user_indexed
+from app.db.database import get_db, get_async_db
 from app.models.user import User
 from app.schemas.auth import Token, LoginRequest, RegisterRequest, AuthResponse
 from app.schemas.user import UserResponse
@@ -21,18 +24,18 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 @router.post("/register", response_model=AuthResponse)
-def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
     # Check if user already exists
-    db_user = db.query(User).filter(User.email == request.email).first()
+    db_user = (await db.execute(select(User).where(User.email == request.email))).scalar_one_or_none()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    db_user = db.query(User).filter(User.username == request.username).first()
+    db_user = (await db.execute(select(User).where(User.username == request.username))).scalar_one_or_none()
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
     
-    # Create new user
-    hashed_password = get_password_hash(request.password)
+    # Create new user; bcrypt runs on the password hashing pool
+    hashed_password = await password_hasher.hash(request.password)
     db_user = User(
         username=request.username,
         email=request.email,
@@ -40,8 +43,11 @@ def register(request: RegisterRequest, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    for statement in user_indexed(db_user):
+        await db.execute(statement)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Create access token
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
@@ -58,12 +64,12 @@ def register(request: RegisterRequest, db: Session = Depends(get_db)):
     }
 
 @router.post("/login", response_model=AuthResponse)
-def login(
+async def login(
     response: Response,
     request: LoginRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = authenticate_user(db, request.email, request.password)
+    user = await authenticate_user(db, request.email, request.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,15 +1,54 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import delete, insert, tuple_
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
+from app.core.archive import archive_store
+from app.core import changes, chat_summary, versions
 from app.core.auth import get_current_user
+from app.core.membership import publish_membership_change
+from app.core.search import search_index
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
 from app.db.database import get_db
 from app.models.user import User
-from app.models.chat import Chat
+from app.models.chat import Chat, ChatParticipant
 from app.schemas.chat import ChatCreate, ChatResponse, ChatUpdate
+from app.schemas.message import MessageResponse
 
 router = APIRouter()
 
+def build_chat_response(chat: Chat, unread_count: Optional[int]) -> ChatResponse:
+    """Fill in last_message and unread_count from the denormalized summary"""
+    response = ChatResponse.model_validate(chat)
+    response.unread_count = unread_count or 0
+    if chat.last_message_id is not None:
+        is_read = chat_summary.read_check({
+            member.user_id: member.last_read_message_id
+            for member in chat.members if member.last_read_message_id is not None
+        })
+        response.last_message = MessageResponse(
+            id=chat.last_message_id,
+            chat_id=chat.id,
+            sender_id=chat.last_message_sender_id,
+            content=chat.last_message_preview or "",
+            created_at=chat.last_message_at,
+            read=is_read(chat.last_message_id, chat.last_message_sender_id)
+        )
+    return response
+
+def existing_user_ids(db: Session, user_ids: List[int]) -> List[int]:
+    """The given ids that belong to a user, deduplicated and in order, in one SELECT"""
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
+    found = {user_id for (user_id,) in db.query(User.id).filter(User.id.in_(user_ids))}
+    return [user_id for user_id in user_ids if user_id in found]
+
+def add_participants(db: Session, chat_id: int, user_ids: List[int]):
+    # One multi-row INSERT instead of an ORM append per participant
+    if user_ids:
+        db.execute(insert(ChatParticipant), [{"chat_id": chat_id, "user_id": user_id} for user_id in user_ids])
+
 @router.post("/", response_model=ChatResponse, status_code=status.HTTP_201_CREATED)
 def create_chat(
     chat_data: ChatCreate,
@@ -18,56 +57,105 @@ def create_chat(
 ):
     """Create a new chat with participants"""
     # Create new chat
-    new_chat = Chat(name=chat_data.name, created_by=current_user.id)
+    new_chat = Chat(name=chat_data.name, is_group=chat_data.is_group, created_by=current_user.id)
     db.add(new_chat)
-    db.commit()
-    db.refresh(new_chat)
+    db.flush()
     
-    # Add participants (including creator)
-    new_chat.participants.append(current_user)
-    
-    # Add other participants if provided
-    if chat_data.participant_ids:
-        for participant_id in chat_data.participant_ids:
-            if participant_id != current_user.id:  # Skip if it's the current user
-                participant = db.query(User).filter(User.id == participant_id).first()
-                if participant:
-                    new_chat.participants.append(participant)
-                else:
-                    # We don't throw an error if a participant doesn't exist, just skip them
-                    pass
+    # Add the creator and every other participant that exists; unknown ids
+    # are skipped rather than rejected
+    other_ids = [participant_id for participant_id in chat_data.participant_ids if participant_id != current_user.id]
+    member_ids = [current_user.id] + existing_user_ids(db, other_ids)
+    add_participants(db, new_chat.id, member_ids)
     
+    statements = versions.chats_changed([new_chat.id]) + versions.chat_lists_changed(member_ids)
+    for statement in statements + changes.members_added(new_chat.id, member_ids):
+        db.execute(statement)
     db.commit()
     db.refresh(new_chat)
     
+    publish_membership_change("add_chat", new_chat.id, member_ids)
+    
     return new_chat
 
 @router.get("/", response_model=List[ChatResponse])
 def get_user_chats(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from a previous page's {NEXT_CURSOR_HEADER} header"),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of chats to return"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all chats where the current user is a participant"""
-    user_chats = current_user.chats
-    return user_chats
+    """Get the current user's chats, most recently active first"""
+    # The cursor and limit are part of the URL, so they need not be part of the tag
+    tag = versions.list_etag(db, current_user.id)
+    cached = versions.not_modified(request, tag)
+    if cached:
+        return cached
+    versions.set_etag(response, tag)
+    
+    # One query on the (user_id, last_activity_at, chat_id) index; participants
+    # and member rows for the whole page are loaded with one SELECT ... IN each
+    query = db.query(
+        Chat, ChatParticipant.unread_count, ChatParticipant.last_activity_at
+    ).join(
+        ChatParticipant, ChatParticipant.chat_id == Chat.id
+    ).filter(
+        ChatParticipant.user_id == current_user.id
+    ).options(
+        selectinload(Chat.participants),
+        selectinload(Chat.members)
+    )
+    
+    if cursor:
+        _, last_activity_at, chat_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(ChatParticipant.last_activity_at, ChatParticipant.chat_id) < tuple_(last_activity_at, chat_id)
+        )
+    
+    rows = query.order_by(
+        ChatParticipant.last_activity_at.desc(),
+        ChatParticipant.chat_id.desc()
+    ).limit(limit + 1).all()
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_chat, _, last_activity_at = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor("before", last_activity_at, last_chat.id)
+    
+    return [build_chat_response(chat, unread_count) for chat, unread_count, _ in rows]
 
 @router.get("/{chat_id}", response_model=ChatResponse)
 def get_chat(
     chat_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get a specific chat by ID"""
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    # The caller's participant row comes with the chat, so membership is
+    # checked in the database even when this worker's index lags behind
+    row = db.query(Chat, ChatParticipant.user_id, ChatParticipant.unread_count).outerjoin(
+        ChatParticipant,
+        (ChatParticipant.chat_id == Chat.id) & (ChatParticipant.user_id == current_user.id)
+    ).filter(Chat.id == chat_id).first()
     
-    if not chat:
+    if not row:
         raise HTTPException(status_code=404, detail="Chat not found")
     
+    chat, participant_id, unread_count = row
     # Check if user is a participant
-    if current_user not in chat.participants:
+    if participant_id is None:
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
     
-    return chat
+    # Version and unread count together cover everything in the response
+    tag = versions.etag("c", chat_id, chat.version or 0, unread_count or 0)
+    cached = versions.not_modified(request, tag)
+    if cached:
+        return cached
+    versions.set_etag(response, tag)
+    return build_chat_response(chat, unread_count)
 
 @router.patch("/{chat_id}", response_model=ChatResponse)
 def update_chat(
@@ -77,38 +165,73 @@ def update_chat(
     current_user: User = Depends(get_current_user)
 ):
     """Update chat name or add/remove participants"""
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    # Locking the chat row serializes concurrent updates of its membership
+    # on Postgres; SQLite already serializes writers
+    chat = db.query(Chat).filter(Chat.id == chat_id).with_for_update().first()
     
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
     
+    # Membership comes from chat_participants in this transaction, not from
+    # the process-local index, which can lag behind other workers. One
+    # SELECT covers the caller and every id to add or remove.
+    requested_ids = {current_user.id}
+    requested_ids.update(chat_update.add_participant_ids or [])
+    requested_ids.update(chat_update.remove_participant_ids or [])
+    member_ids = {
+        user_id for (user_id,) in db.query(ChatParticipant.user_id).filter(
+            ChatParticipant.chat_id == chat_id,
+            ChatParticipant.user_id.in_(requested_ids)
+        )
+    }
+    
     # Check if user is a participant
-    if current_user not in chat.participants:
+    if current_user.id not in member_ids:
         raise HTTPException(status_code=403, detail="Not authorized to access this chat")
     
     # Update chat name if provided
     if chat_update.name:
         chat.name = chat_update.name
     
-    # Add new participants if provided
+    # Set-based membership changes: one SELECT validates the ids to add,
+    # then one multi-row INSERT and one DELETE
+    added_ids = []
     if chat_update.add_participant_ids:
-        for participant_id in chat_update.add_participant_ids:
-            participant = db.query(User).filter(User.id == participant_id).first()
-            if participant and participant not in chat.participants:
-                chat.participants.append(participant)
+        candidate_ids = [
+            participant_id for participant_id in chat_update.add_participant_ids
+            if participant_id not in member_ids
+        ]
+        added_ids = existing_user_ids(db, candidate_ids)
+        add_participants(db, chat_id, added_ids)
     
-    # Remove participants if provided
+    removed_ids = []
     if chat_update.remove_participant_ids:
-        for participant_id in chat_update.remove_participant_ids:
-            # Don't allow removing the current user (should be done via leave_chat)
-            if participant_id != current_user.id:
-                participant = db.query(User).filter(User.id == participant_id).first()
-                if participant and participant in chat.participants:
-                    chat.participants.remove(participant)
+        # Don't allow removing the current user (should be done via leave_chat)
+        removed_ids = [
+            participant_id for participant_id in dict.fromkeys(chat_update.remove_participant_ids)
+            if participant_id != current_user.id and participant_id in member_ids
+        ]
+        if removed_ids:
+            db.execute(delete(ChatParticipant).where(
+                ChatParticipant.chat_id == chat_id,
+                ChatParticipant.user_id.in_(removed_ids)
+            ))
     
+    db.flush()
+    statements = versions.chats_changed([chat_id]) + versions.chat_lists_changed(added_ids + removed_ids)
+    if chat_update.name:
+        statements += changes.chat_renamed(chat_id, chat_update.name)
+    statements += changes.members_added(chat_id, added_ids) + changes.members_removed(chat_id, removed_ids)
+    for statement in statements:
+        db.execute(statement)
     db.commit()
     db.refresh(chat)
     
+    if added_ids:
+        publish_membership_change("add_members", chat_id, added_ids)
+    if removed_ids:
+        publish_membership_change("remove_members", chat_id, removed_ids)
+    
     return chat
 
 @router.delete("/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -118,7 +241,9 @@ def delete_chat(
     current_user: User = Depends(get_current_user)
 ):
     """Delete a chat (only creator can delete)"""
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
+    # Lock the chat row before the change log's append lock, in the same
+    # order as message writes and edits, so the two cannot deadlock
+    chat = db.query(Chat).filter(Chat.id == chat_id).with_for_update().first()
     
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
@@ -127,7 +252,16 @@ def delete_chat(
     if chat.created_by != current_user.id:
         raise HTTPException(status_code=403, detail="Only the chat creator can delete the chat")
     
+    # Before the participants go: they select whose chat lists change
+    statements = versions.chat_lists_changed(versions.members_of(chat_id)) + changes.chat_deleted(chat_id)
+    for statement in statements:
+        db.execute(statement)
     db.delete(chat)
+    for statement in search_index.chat_deleted(chat_id):
+        db.execute(statement)
     db.commit()
+    archive_store.remove_chat(chat_id)
+    
+    publish_membership_change("remove_chat", chat_id)
     
     return None
@@ -1,19 +1,37 @@
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import desc, tuple_
 from typing import List, Optional
+from app.core import chat_summary, versions
+from app.core.archive import archive_store
 from app.core.auth import get_current_user
+from app.core.membership import membership_index
+from app.core.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor, encode_token, decode_token
+from app.core.search import search_index
+from app.core.serialization import MESSAGE_COLUMNS, MESSAGE_FIELDS, MessageRow, RowsResponse
 from app.db.database import get_db
 from app.models.user import User
 from app.models.chat import Chat
 from app.models.message import Message
-from app.schemas.message import MessageCreate, MessageResponse, MessageUpdate
+from app.schemas.message import MessageBatchCreate, MessageCreate, MessageResponse, MessageUpdate, MessageSearchResult
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+def with_read_flags(db: Session, messages) -> List[MessageRow]:
+    """Messages as MessageRows whose read flag comes from the members' read watermarks"""
+    watermarks = chat_summary.read_watermarks(db, {message.chat_id for message in messages})
+    checks = {chat_id: chat_summary.read_check(marks) for chat_id, marks in watermarks.items()}
+    return [
+        MessageRow(
+            message.content, message.id, message.chat_id, message.sender_id, message.created_at,
+            message.chat_id in checks and checks[message.chat_id](message.id, message.sender_id)
+        )
+        for message in messages
+    ]
+
 @router.post("/", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 def create_message(
     message_data: MessageCreate,
@@ -22,12 +40,11 @@ def create_message(
 ):
     """Create a new message in a chat"""
     # Check if chat exists
-    chat = db.query(Chat).filter(Chat.id == message_data.chat_id).first()
-    if not chat:
+    if not membership_index.has_chat(message_data.chat_id):
         raise HTTPException(status_code=404, detail="Chat not found")
     
     # Check if user is a participant in the chat
-    if current_user not in chat.participants:
+    if not membership_index.is_member(message_data.chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to send messages to this chat")
     
     # Create new message
@@ -38,37 +55,183 @@ def create_message(
     )
     
     db.add(new_message)
+    db.flush()
+    for statement in chat_summary.messages_inserted([new_message]):
+        db.execute(statement)
+    for statement in search_index.messages_indexed([new_message]):
+        db.execute(statement)
     db.commit()
     db.refresh(new_message)
     
     return new_message
 
+@router.post("/batch", response_model=List[MessageResponse], status_code=status.HTTP_201_CREATED)
+def create_messages(
+    batch: MessageBatchCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create several messages in one transaction; all are rejected if any chat is not allowed"""
+    for chat_id in dict.fromkeys(message.chat_id for message in batch.messages):
+        if not membership_index.has_chat(chat_id):
+            raise HTTPException(status_code=404, detail=f"Chat {chat_id} not found")
+        if not membership_index.is_member(chat_id, current_user.id):
+            raise HTTPException(status_code=403, detail=f"Not authorized to send messages to chat {chat_id}")
+    
+    new_messages = [
+        Message(content=message.content, chat_id=message.chat_id, sender_id=current_user.id)
+        for message in batch.messages
+    ]
+    
+    # One transaction (a multi-row INSERT on Postgres, one INSERT per row on
+    # SQLite), then the summary and search statements for the whole batch
+    db.add_all(new_messages)
+    db.flush()
+    for statement in chat_summary.messages_inserted(new_messages) + search_index.messages_indexed(new_messages):
+        db.execute(statement)
+    # Read the values before commit expires them (each refresh is a SELECT)
+    rows = [
+        MessageRow(message.content, message.id, message.chat_id, message.sender_id, message.created_at, bool(message.read))
+        for message in new_messages
+    ]
+    db.commit()
+    
+    return rows
+
 @router.get("/chat/{chat_id}", response_model=List[MessageResponse])
 def get_chat_messages(
     chat_id: int,
-    skip: int = Query(0, description="Number of messages to skip (for pagination)"),
-    limit: int = Query(50, description="Maximum number of messages to return"),
+    request: Request,
+    before_id: Optional[int] = Query(None, description="Return messages older than this message (newest first)"),
+    after_id: Optional[int] = Query(None, description="Return messages newer than this message (oldest first)"),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from a previous page's {NEXT_CURSOR_HEADER} header"),
+    limit: int = Query(50, ge=1, le=200, description="Maximum number of messages to return"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get messages from a specific chat with pagination"""
+    """Get messages from a specific chat, newest first, with keyset pagination"""
     # Check if chat exists
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
-    if not chat:
+    if not membership_index.has_chat(chat_id):
         raise HTTPException(status_code=404, detail="Chat not found")
     
     # Check if user is a participant in the chat
-    if current_user not in chat.participants:
+    if not membership_index.is_member(chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to view messages in this chat")
     
-    # Get messages with pagination, ordered by timestamp (newest last)
-    messages = db.query(Message).filter(
-        Message.chat_id == chat_id
-    ).order_by(
-        Message.timestamp.asc()
-    ).offset(skip).limit(limit).all()
+    # Every message write bumps the chat's version, so an unchanged version
+    # means an unchanged page and the message tables need not be read
+    tag = versions.etag("m", chat_id, db.query(Chat.version).filter(Chat.id == chat_id).scalar() or 0)
+    cached = versions.not_modified(request, tag)
+    if cached:
+        return cached
+    
+    archive = archive_store.chat(chat_id)
+    
+    # Resolve the page anchor: (created_at, id) of the last message seen
+    anchor = None
+    direction = "before"
+    if cursor:
+        direction, created_at, anchor_id = decode_cursor(cursor)
+        anchor = (created_at, anchor_id)
+    elif before_id is not None or after_id is not None:
+        direction = "after" if after_id is not None else "before"
+        anchor_id = after_id if after_id is not None else before_id
+        created_at = db.query(Message.created_at).filter(
+            Message.id == anchor_id,
+            Message.chat_id == chat_id
+        ).scalar()
+        if created_at is None:
+            archived = archive.find(anchor_id)
+            if archived is None:
+                raise HTTPException(status_code=404, detail="Message not found")
+            created_at = archived.created_at
+        anchor = (created_at, anchor_id)
     
-    return messages
+    # Seek on the (chat_id, created_at, id) index instead of OFFSET, so every
+    # page costs the same no matter how deep into the history it is.
+    # Archived messages all sort before the hot ones, so a page that runs
+    # past either tier continues in the other.
+    query = db.query(*MESSAGE_COLUMNS).filter(Message.chat_id == chat_id)
+    position = tuple_(Message.created_at, Message.id)
+    boundary = archive.last_key
+    if boundary is not None:
+        query = query.filter(position > tuple_(*boundary))
+    if direction == "before":
+        if anchor:
+            query = query.filter(position < tuple_(*anchor))
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+        messages = []
+        if anchor is None or boundary is None or anchor > boundary:
+            messages = query.limit(limit + 1).all()
+        if boundary is not None and len(messages) <= limit:
+            archive_anchor = anchor if anchor is not None and anchor <= boundary else None
+            messages += archive.page_before(archive_anchor, limit + 1 - len(messages))
+    else:
+        query = query.filter(position > tuple_(*anchor))
+        query = query.order_by(Message.created_at.asc(), Message.id.asc())
+        messages = []
+        if boundary is not None and anchor < boundary:
+            messages = archive.page_after(anchor, limit + 1)
+        if len(messages) <= limit:
+            messages += query.limit(limit + 1 - len(messages)).all()
+    
+    headers = {"ETag": tag, "Cache-Control": versions.CACHE_CONTROL}
+    if len(messages) > limit:
+        messages = messages[:limit]
+        last = messages[-1]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(direction, last.created_at, last.id)
+    
+    # Column tuples rendered straight to JSON; same schema as MessageResponse
+    return RowsResponse(MESSAGE_FIELDS, with_read_flags(db, messages), headers=headers)
+
+@router.get("/search", response_model=List[MessageSearchResult])
+def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to search for"),
+    chat_id: Optional[int] = Query(None, description="Only search this chat"),
+    cursor: Optional[str] = Query(None, description=f"Opaque cursor from a previous page's {NEXT_CURSOR_HEADER} header"),
+    limit: int = Query(20, ge=1, le=100, description="Maximum number of results to return"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Full-text search over messages in the current user's chats, best matches first"""
+    if chat_id is not None:
+        if not membership_index.is_member(chat_id, current_user.id):
+            raise HTTPException(status_code=403, detail="Not authorized to search this chat")
+        chat_ids = [chat_id]
+    else:
+        chat_ids = list(membership_index.chats_of(current_user.id))
+    
+    after = None
+    if cursor:
+        data = decode_token(cursor)
+        try:
+            after = (float(data["s"]), int(data["id"]))
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    hits = search_index.search(db, q, chat_ids, limit + 1, after)
+    if len(hits) > limit:
+        hits = hits[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_token({"s": hits[-1].score, "id": hits[-1].message_id})
+    
+    found = db.query(*MESSAGE_COLUMNS).filter(Message.id.in_([hit.message_id for hit in hits])).all()
+    # Hits missing from the table are archived; each names its chat
+    hot_ids = {message.id for message in found}
+    for hit in hits:
+        if hit.message_id not in hot_ids:
+            archived = archive_store.chat(hit.chat_id).find(hit.message_id)
+            if archived is not None:
+                found.append(archived)
+    messages = {message.id: message for message in with_read_flags(db, found)}
+    return [
+        MessageSearchResult(
+            message=MessageResponse(**messages[hit.message_id]._asdict()),
+            snippet=hit.snippet,
+            score=hit.score
+        )
+        for hit in hits if hit.message_id in messages
+    ]
 
 @router.get("/{message_id}", response_model=MessageResponse)
 def get_message(
@@ -79,15 +242,17 @@ def get_message(
     """Get a specific message by ID"""
     message = db.query(Message).filter(Message.id == message_id).first()
     
+    if not message:
+        message = archive_store.find(membership_index.chats_of(current_user.id), message_id)
+    
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
     
     # Check if user is a participant in the chat where message belongs
-    chat = db.query(Chat).filter(Chat.id == message.chat_id).first()
-    if current_user not in chat.participants:
+    if not membership_index.is_member(message.chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not authorized to view this message")
     
-    return message
+    return with_read_flags(db, [message])[0]
 
 @router.patch("/{message_id}", response_model=MessageResponse)
 def update_message(
@@ -100,6 +265,8 @@ def update_message(
     message = db.query(Message).filter(Message.id == message_id).first()
     
     if not message:
+        if archive_store.find(membership_index.chats_of(current_user.id), message_id):
+            raise HTTPException(status_code=409, detail="Archived messages are read-only")
         raise HTTPException(status_code=404, detail="Message not found")
     
     # Only sender can update message
@@ -110,11 +277,14 @@ def update_message(
     if message_update.content:
         message.content = message_update.content
         message.is_edited = True
+        db.flush()
+        for statement in chat_summary.message_edited(message) + search_index.message_edited(message):
+            db.execute(statement)
     
     db.commit()
     db.refresh(message)
     
-    return message
+    return with_read_flags(db, [message])[0]
 
 @router.delete("/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_message(
@@ -126,6 +296,8 @@ def delete_message(
     message = db.query(Message).filter(Message.id == message_id).first()
     
     if not message:
+        if archive_store.find(membership_index.chats_of(current_user.id), message_id):
+            raise HTTPException(status_code=409, detail="Archived messages are read-only")
         raise HTTPException(status_code=404, detail="Message not found")
     
     # Only sender can delete message
@@ -133,6 +305,9 @@ def delete_message(
         raise HTTPException(status_code=403, detail="Only the sender can delete this message")
     
     db.delete(message)
+    db.flush()
+    for statement in chat_summary.message_deleted(message) + search_index.messages_deleted([message.id]):
+        db.execute(statement)
     db.commit()
     
     return None
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from typing import Optional
+from app.core import changes
+from app.core.auth import get_current_user
+from app.core.membership import membership_index
+from app.db.database import get_db
+from app.models.change import ChangeLog
+from app.models.user import User
+from app.schemas.sync import SyncResponse
+
+router = APIRouter()
+
+@router.get("", response_model=SyncResponse)
+def sync_changes(
+    since: Optional[int] = Query(None, ge=0, description="next from the previous call; omit to get the current position only"),
+    limit: int = Query(500, ge=1, le=2000, description="Maximum number of log entries to read"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Changes in the current user's chats after a position in the change log, compacted"""
+    if since is None:
+        # Take the position before loading state over REST, then sync from it.
+        # Changes after it may be replayed, never skipped: seqs become
+        # visible in order (see changes.SERIALIZE_APPENDS).
+        head = db.query(func.max(ChangeLog.seq)).scalar() or 0
+        return SyncResponse(changes=[], next=head, has_more=False)
+    
+    # Changes in chats the user is in now, plus those addressed to them
+    # (removed from a chat, chat deleted), which are no longer in that set
+    entries = db.query(ChangeLog).filter(
+        ChangeLog.seq > since,
+        or_(
+            ChangeLog.chat_id.in_(list(membership_index.chats_of(current_user.id))),
+            ChangeLog.user_id == current_user.id
+        )
+    ).order_by(ChangeLog.seq).limit(limit + 1).all()
+    
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    
+    return SyncResponse(
+        changes=changes.compact(entries),
+        next=entries[-1].seq if entries else since,
+        has_more=has_more
+    )
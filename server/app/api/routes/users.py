@@ -1,14 +1,23 @@
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from app.core.auth import get_current_user, get_password_hash
-from app.db.database import get_db
+from typing import List, Optional
+from app.core import versions
+from app.core.auth import get_current_user, get_current_user_async, invalidate_user
+from app.core.passwords import password_hasher
+from app.core.serialization import USER_COLUMNS, USER_FIELDS, RowsResponse
+from app.core.user_search import search_user_ids, user_indexed
+from app.db.database import get_db, get_async_db
 from app.models.user import User
 from app.schemas.user import UserResponse, UserUpdate
 
 router = APIRouter()
 
+# Users per GET /api/users/?ids= request
+MAX_LOOKUP_IDS = 500
+
 @router.get("/me", response_model=UserResponse)
 def get_current_user_info(
     current_user: User = Depends(get_current_user)
@@ -20,12 +29,24 @@ def get_current_user_info(
 def get_users(
     skip: int = 0,
     limit: int = 100,
+    ids: Optional[str] = Query(None, description="Comma-separated user ids to look up (up to 500); skip and limit are ignored"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Get list of users (for search, adding to chats)"""
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    """Get list of users (for search, adding to chats), or the given users in one call"""
+    if ids is not None:
+        try:
+            user_ids = list(dict.fromkeys(int(user_id) for user_id in ids.split(",") if user_id.strip()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+        if len(user_ids) > MAX_LOOKUP_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_IDS} ids per request")
+        # One SELECT ... IN; unknown ids are left out, the rest keep the requested order
+        users = {user.id: user for user in db.query(*USER_COLUMNS).filter(User.id.in_(user_ids))}
+        return RowsResponse(USER_FIELDS, [users[user_id] for user_id in user_ids if user_id in users])
+    
+    users = db.query(*USER_COLUMNS).offset(skip).limit(limit).all()
+    return RowsResponse(USER_FIELDS, users)
 
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user(
@@ -40,35 +61,44 @@ def get_user(
     return user
 
 @router.patch("/me", response_model=UserResponse)
-def update_user(
+async def update_user(
     user_update: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """Update current user information"""
     # Update username if provided
     if user_update.username is not None:
         # Check if username is already taken
-        existing_user = db.query(User).filter(User.username == user_update.username).first()
+        existing_user = (await db.execute(
+            select(User).where(User.username == user_update.username)
+        )).scalar_one_or_none()
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(status_code=400, detail="Username already taken")
         current_user.username = user_update.username
     
     # Update password if provided
     if user_update.password is not None:
-        hashed_password = get_password_hash(user_update.password)
+        hashed_password = await password_hasher.hash(user_update.password)
         current_user.hashed_password = hashed_password
     
     # Update email if provided
     if user_update.email is not None:
         # Check if email is already taken
-        existing_user = db.query(User).filter(User.email == user_update.email).first()
+        existing_user = (await db.execute(
+            select(User).where(User.email == user_update.email)
+        )).scalar_one_or_none()
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(status_code=400, detail="Email already taken")
         current_user.email = user_update.email
     
-    db.commit()
-    db.refresh(current_user)
+    if user_update.username is not None or user_update.email is not None:
+        for statement in user_indexed(current_user) + versions.user_renamed(current_user.id):
+            await db.execute(statement)
+    
+    await db.commit()
+    invalidate_user(current_user.id)
+    await db.refresh(current_user)
     
     return current_user
 
@@ -79,14 +109,12 @@ def search_users(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Search users by username or email"""
+    """Search users by username or email: exact, then prefix, then word-prefix matches"""
     if not query or len(query) < 2:
         raise HTTPException(status_code=400, detail="Search query must be at least 2 characters")
     
-    # Search users by username or email (case insensitive)
-    users = db.query(User).filter(
-        (User.username.ilike(f"%{query}%")) | 
-        (User.email.ilike(f"%{query}%"))
-    ).filter(User.id != current_user.id).limit(limit).all()
+    # Ranked lookup on the prefix/token index instead of a '%q%' scan
+    user_ids = search_user_ids(db, query, current_user.id, limit)
+    users = {user.id: user for user in db.query(*USER_COLUMNS).filter(User.id.in_(user_ids))}
     
-    return users
+    return RowsResponse(USER_FIELDS, [users[user_id] for user_id in user_ids if user_id in users])
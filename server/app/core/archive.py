@@ -0,0 +1,366 @@
+import asyncio
+import bisect
+import fcntl
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.serialization import MESSAGE_COLUMNS, MessageRow
+from app.models.message import Message
+
+logger = logging.getLogger(__name__)
+
+# Segment layout:
+#   MAGIC
+#   block*   zlib(JSON list of [id, sender_id, content, created_at, read])
+#   index    zlib(JSON list of [first_at, first_id, last_at, last_id, min_id, max_id, offset, length])
+#   footer   index offset, index length, MAGIC
+# Rows are sorted by (created_at, id), the same order as pagination cursors.
+MAGIC = b"MSGSEG01"
+FOOTER = struct.Struct(">QI8s")
+SEGMENT_SUFFIX = ".seg"
+
+Key = Tuple[datetime, int]
+
+def _row(message: MessageRow) -> list:
+    return [message.id, message.sender_id, message.content, message.created_at.isoformat(), bool(message.read)]
+
+def _key(row: list) -> Key:
+    return datetime.fromisoformat(row[3]), row[0]
+
+class Block:
+    __slots__ = ("first", "last", "min_id", "max_id", "offset", "length")
+
+    def __init__(self, entry: list):
+        first_at, first_id, last_at, last_id, self.min_id, self.max_id, self.offset, self.length = entry
+        self.first = (datetime.fromisoformat(first_at), first_id)
+        self.last = (datetime.fromisoformat(last_at), last_id)
+
+class Segment:
+    """One immutable segment file, memory-mapped and read a block at a time."""
+
+    def __init__(self, path: str, blocks_cache: TTLCache):
+        self.path = path
+        self.blocks_cache = blocks_cache
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset, index_length, magic = FOOTER.unpack(self.data[-FOOTER.size:])
+        if magic != MAGIC or self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a message segment: {path}")
+        index = json.loads(zlib.decompress(self.data[index_offset:index_offset + index_length]))
+        self.blocks = [Block(entry) for entry in index]
+        self.first_keys = [block.first for block in self.blocks]
+        self.first = self.blocks[0].first
+        self.last = self.blocks[-1].last
+
+    def rows(self, n: int) -> List[list]:
+        cache_key = (self.path, n)
+        rows = self.blocks_cache.get(cache_key)
+        if rows is None:
+            block = self.blocks[n]
+            rows = json.loads(zlib.decompress(self.data[block.offset:block.offset + block.length]))
+            self.blocks_cache.set(cache_key, rows)
+        return rows
+
+    def close(self):
+        self.data.close()
+
+def write_segment(path: str, rows: List[list], block_size: int):
+    """Write rows (already in key order) as a new segment, atomically."""
+    tmp_path = path + ".tmp"
+    index = []
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        offset = len(MAGIC)
+        for start in range(0, len(rows), block_size):
+            chunk = rows[start:start + block_size]
+            payload = zlib.compress(json.dumps(chunk, separators=(",", ":")).encode())
+            ids = [row[0] for row in chunk]
+            index.append([
+                chunk[0][3], chunk[0][0], chunk[-1][3], chunk[-1][0],
+                min(ids), max(ids), offset, len(payload),
+            ])
+            f.write(payload)
+            offset += len(payload)
+        payload = zlib.compress(json.dumps(index, separators=(",", ":")).encode())
+        f.write(payload)
+        f.write(FOOTER.pack(offset, len(payload), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    # Make the rename itself durable before the rows leave the database
+    directory = os.open(os.path.dirname(path), os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+class ChatArchive:
+    """A chat's archived history: segments in key order, oldest first.
+
+    Every archived message sorts before every message still in the hot
+    table, so a history page is a hot query continued into the archive
+    (or the other way around when paging forward).
+    """
+
+    def __init__(self, chat_id: int, directory: str, segments: List[Segment], mtime: Optional[int]):
+        self.chat_id = chat_id
+        self.directory = directory
+        self.segments = segments
+        # Directory mtime the segment list was read at (None: no directory)
+        self.mtime = mtime
+
+    @property
+    def last_key(self) -> Optional[Key]:
+        return self.segments[-1].last if self.segments else None
+
+    def _message(self, row: list) -> MessageRow:
+        message_id, sender_id, content, created_at, read = row
+        return MessageRow(content, message_id, self.chat_id, sender_id, datetime.fromisoformat(created_at), read)
+
+    def page_before(self, anchor: Optional[Key], limit: int) -> List[MessageRow]:
+        """Up to limit messages older than anchor (or the newest ones), newest first."""
+        messages: List[MessageRow] = []
+        for segment in reversed(self.segments):
+            if anchor is not None and segment.first >= anchor:
+                continue
+            n = len(segment.blocks) - 1
+            if anchor is not None:
+                n = bisect.bisect_left(segment.first_keys, anchor) - 1
+            for block in range(n, -1, -1):
+                for row in reversed(segment.rows(block)):
+                    if anchor is not None and _key(row) >= anchor:
+                        continue
+                    messages.append(self._message(row))
+                    if len(messages) == limit:
+                        return messages
+        return messages
+
+    def page_after(self, anchor: Key, limit: int) -> List[MessageRow]:
+        """Up to limit messages newer than anchor, oldest first."""
+        messages: List[MessageRow] = []
+        for segment in self.segments:
+            if segment.last <= anchor:
+                continue
+            n = max(bisect.bisect_right(segment.first_keys, anchor) - 1, 0)
+            for block in range(n, len(segment.blocks)):
+                for row in segment.rows(block):
+                    if _key(row) <= anchor:
+                        continue
+                    messages.append(self._message(row))
+                    if len(messages) == limit:
+                        return messages
+        return messages
+
+    def find(self, message_id: int) -> Optional[MessageRow]:
+        for segment in self.segments:
+            for n, block in enumerate(segment.blocks):
+                if block.min_id <= message_id <= block.max_id:
+                    for row in segment.rows(n):
+                        if row[0] == message_id:
+                            return self._message(row)
+        return None
+
+class ArchiveStore:
+    """Per-chat directories of append-only, compressed segment files.
+
+    Segments are opened lazily on first access and stay mapped; decoded
+    blocks are kept in a small LRU so paging through one stretch of
+    history decompresses each block once. A chat's directory is re-listed
+    whenever its mtime changes, so segments written or removed by another
+    worker are seen on the next read. Sync routes read this from FastAPI's
+    threadpool, hence the lock around the chat map.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.chats: Dict[int, ChatArchive] = {}
+        self.blocks = TTLCache(settings.archive_block_cache_size, settings.archive_block_cache_ttl_seconds)
+        self._lock = threading.Lock()
+
+    def _directory(self, chat_id: int) -> str:
+        return os.path.join(self.root, str(chat_id))
+
+    def chat(self, chat_id: int) -> ChatArchive:
+        mtime = _mtime(self._directory(chat_id))
+        archive = self.chats.get(chat_id)
+        if archive is not None and archive.mtime == mtime:
+            return archive
+        with self._lock:
+            archive = self.chats.get(chat_id)
+            if archive is None or archive.mtime != mtime:
+                archive = self._open(chat_id, archive)
+                self.chats[chat_id] = archive
+            return archive
+
+    def _open(self, chat_id: int, previous: Optional[ChatArchive] = None) -> ChatArchive:
+        directory = self._directory(chat_id)
+        # Read the mtime first: a segment added meanwhile changes it again
+        mtime = _mtime(directory)
+        names = _segment_names(directory) if mtime is not None else []
+        # Segments are immutable, so ones already mapped are reused as they are
+        opened = {segment.path: segment for segment in previous.segments} if previous is not None else {}
+        segments = []
+        for name in names:
+            path = os.path.join(directory, name)
+            segments.append(opened.get(path) or Segment(path, self.blocks))
+        return ChatArchive(chat_id, directory, segments, mtime)
+
+    def find(self, chat_ids: Iterable[int], message_id: int) -> Optional[MessageRow]:
+        for chat_id in chat_ids:
+            message = self.chat(chat_id).find(message_id)
+            if message is not None:
+                return message
+        return None
+
+    def append(self, chat_id: int, messages: List[MessageRow]):
+        """Archive messages (in key order, all newer than the archive's last key)."""
+        directory = self._directory(chat_id)
+        os.makedirs(directory, exist_ok=True)
+        # Named from the directory, not the cached list, which may be stale.
+        # Zero-padded sequence numbers keep lexical order equal to key order.
+        names = _segment_names(directory)
+        number = int(names[-1][:-len(SEGMENT_SUFFIX)]) + 1 if names else 1
+        path = os.path.join(directory, f"{number:08d}{SEGMENT_SUFFIX}")
+        write_segment(path, [_row(message) for message in messages], settings.archive_block_size)
+
+    def remove_chat(self, chat_id: int):
+        with self._lock:
+            archive = self.chats.pop(chat_id, None)
+        if archive is not None:
+            for segment in archive.segments:
+                for n in range(len(segment.blocks)):
+                    self.blocks.pop((segment.path, n))
+                segment.close()
+        shutil.rmtree(self._directory(chat_id), ignore_errors=True)
+
+    def stats(self) -> dict:
+        return {
+            "chats_open": len(self.chats),
+            "block_cache_hit_rate": self.blocks.hits / max(self.blocks.hits + self.blocks.misses, 1),
+        }
+
+def _mtime(directory: str) -> Optional[int]:
+    try:
+        return os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _segment_names(directory: str) -> List[str]:
+    try:
+        return sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+    except FileNotFoundError:
+        return []
+
+archive_store = ArchiveStore(settings.archive_dir)
+
+def archive_chat(db: Session, chat_id: int, cutoff: datetime) -> int:
+    """Move one batch of the chat's messages older than cutoff into a segment."""
+    archive = archive_store.chat(chat_id)
+    position = tuple_(Message.created_at, Message.id)
+    query = db.query(*MESSAGE_COLUMNS).filter(Message.chat_id == chat_id, Message.created_at < cutoff)
+    if archive.last_key is not None:
+        query = query.filter(position > tuple_(*archive.last_key))
+    messages = (
+        query.order_by(Message.created_at.asc(), Message.id.asc())
+        .limit(settings.archive_segment_max_messages)
+        .all()
+    )
+    if messages:
+        archive_store.append(chat_id, messages)
+        archive = archive_store.chat(chat_id)
+    # Delete everything the archive now covers, which also clears rows left
+    # behind by a run that stopped between writing a segment and committing.
+    # New messages are always newer than the cutoff, so nothing else matches.
+    # Search rows are kept: search resolves hits from the archive.
+    if archive.last_key is None:
+        return 0
+    message_ids = [
+        message_id for (message_id,) in
+        db.query(Message.id).filter(Message.chat_id == chat_id, position <= tuple_(*archive.last_key))
+    ]
+    if not message_ids:
+        return 0
+    db.query(Message).filter(Message.id.in_(message_ids)).delete(synchronize_session=False)
+    db.commit()
+    return len(message_ids)
+
+def archive_old_messages(db: Session) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=settings.archive_after_days)
+    chat_ids = [
+        chat_id for (chat_id,) in
+        db.query(Message.chat_id).filter(Message.created_at < cutoff).distinct()
+    ]
+    archived = 0
+    for chat_id in chat_ids:
+        while True:
+            deleted = archive_chat(db, chat_id, cutoff)
+            archived += deleted
+            if deleted < settings.archive_segment_max_messages:
+                break
+    return archived
+
+class Archiver:
+    """Periodically moves messages older than archive_after_days to segments.
+
+    Every worker runs one, but a run holds an exclusive lock on the archive
+    directory and is skipped while another worker's run holds it, so only
+    one process ever writes segments.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.archived = 0
+
+    def start(self):
+        if settings.archive_after_days > 0:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
+
+    async def _run(self):
+        while True:
+            try:
+                self.archived += await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                logger.error(f"Archiving messages failed: {str(e)}")
+            await asyncio.sleep(settings.archive_interval_seconds)
+
+    def run_once(self) -> int:
+        from app.db.database import SessionLocal
+
+        os.makedirs(archive_store.root, exist_ok=True)
+        with open(os.path.join(archive_store.root, ".lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            route = metrics.set_route("archive")
+            db = SessionLocal()
+            try:
+                archived = archive_old_messages(db)
+            finally:
+                db.close()
+                metrics.reset_route(route)
+        if archived:
+            logger.info(f"Archived {archived} messages")
+        return archived
+
+archiver = Archiver()
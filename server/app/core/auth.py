@@ -1,24 +1,36 @@
 
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 
-from app.db.database import get_db
+from app.db.database import get_db, get_async_db
 from app.models.user import User
+from app.core.cache import TTLCache
+from app.core.passwords import password_hasher, get_pwd_context
 from app.core.config import settings
 
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# token -> user id, for tokens whose signature and expiry were already checked
+token_cache = TTLCache(settings.auth_token_cache_size, settings.auth_cache_ttl_seconds)
+# user id -> identity columns (never the password hash)
+user_cache = TTLCache(settings.auth_user_cache_size, settings.auth_cache_ttl_seconds)
+
+USER_IDENTITY_COLUMNS = ("id", "username", "email", "is_active", "created_at", "updated_at")
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    # Blocking; request handlers should use password_hasher instead
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    # Blocking; request handlers should use password_hasher instead
+    return get_pwd_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -36,43 +48,122 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     )
     return encoded_jwt
 
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await password_hasher.verify(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # Cost parameters changed since this hash was made
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
-def get_current_user(
-    token: str = Depends(security),
-    db: Session = Depends(get_db)
-):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token_user_id(token) -> int:
+    credentials_exception = _credentials_exception()
+    
+    if isinstance(token, HTTPAuthorizationCredentials):
+        token = token.credentials
+    
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
     
     try:
-        if isinstance(token, HTTPAuthorizationCredentials):
-            token = token.credentials
-        
         payload = jwt.decode(
             token, 
             settings.secret_key, 
             algorithms=[settings.algorithm]
         )
-        user_id: int = payload.get("sub")
+        user_id = payload.get("sub")
         
         if user_id is None:
             raise credentials_exception
-    except jwt.PyJWTError:
+        user_id = int(user_id)
+    except (jwt.PyJWTError, ValueError):
         raise credentials_exception
-        
-    user = db.query(User).filter(User.id == user_id).first()
     
-    if user is None:
-        raise credentials_exception
-        
+    # Never keep a token cached past its own expiry
+    expires_at = payload.get("exp")
+    ttl = expires_at - time.time() if expires_at else None
+    token_cache.set(token, user_id, ttl)
+    return user_id
+
+def invalidate_user(user_id: int):
+    user_cache.pop(user_id)
+
+def _user_from_cache(user_id: int) -> Optional[User]:
+    identity = user_cache.get(user_id)
+    if identity is None:
+        return None
+    # A detached instance that can be merged without a SELECT; unloaded
+    # columns (the password hash) are fetched lazily if ever touched
+    user = User(**identity)
+    make_transient_to_detached(user)
+    return user
+
+def _cache_user(user: User):
+    user_cache.set(user.id, {column: getattr(user, column) for column in USER_IDENTITY_COLUMNS})
+
+def _check_active(user: Optional[User]) -> User:
+    if user is None or user.is_active is False:
+        raise _credentials_exception()
     return user
+
+def get_current_user(
+    token: str = Depends(security),
+    db: Session = Depends(get_db)
+):
+    user_id = decode_token_user_id(token)
+    
+    cached = _user_from_cache(user_id)
+    if cached is not None:
+        return _check_active(db.merge(cached, load=False))
+    
+    user = _check_active(db.query(User).filter(User.id == user_id).first())
+    _cache_user(user)
+    return user
+
+async def get_current_user_async(
+    token: str = Depends(security),
+    db: AsyncSession = Depends(get_async_db)
+):
+    user_id = decode_token_user_id(token)
+    
+    cached = _user_from_cache(user_id)
+    if cached is not None:
+        return _check_active(await db.merge(cached, load=False))
+    
+    user = (await db.execute(select(User).where(User.id == user_id))).scalar_one_or_none()
+    user = _check_active(user)
+    _cache_user(user)
+    return user
+
+def auth_cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
+# Drop cached identities once a change to a user row (profile update,
+# deactivation, ...) has been committed by any session in this process
+@event.listens_for(User, "after_update")
+def _mark_user_changed(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_user_ids", set()).add(target.id)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop("changed_user_ids", ()):
+        invalidate_user(user_id)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_user_ids", None)
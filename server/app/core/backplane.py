@@ -0,0 +1,153 @@
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import anyio
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[dict], Awaitable[None]]
+
+# Dispatched locally (never published) after a lost subscription is
+# restored: events published meanwhile were missed, so state kept in step
+# by events must be reloaded
+RESUBSCRIBED = "resubscribed"
+
+class Backplane:
+    """Fans events out to every worker process, including this one.
+
+    Events are plain JSON-serializable dicts with a "kind" key; handlers
+    are registered per kind and run on every worker that receives the event.
+    """
+
+    def __init__(self):
+        self.handlers: Dict[str, List[EventHandler]] = {}
+
+    def subscribe(self, kind: str, handler: EventHandler):
+        self.handlers.setdefault(kind, []).append(handler)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, event: dict):
+        raise NotImplementedError
+
+    async def dispatch(self, event: dict):
+        for handler in self.handlers.get(event.get("kind"), []):
+            try:
+                await handler(event)
+            except Exception as e:
+                logger.error(f"Backplane handler for {event.get('kind')} failed: {str(e)}")
+
+class InProcessBackplane(Backplane):
+    """Single-worker backplane: publishing is just local dispatch."""
+
+    async def publish(self, event: dict):
+        await self.dispatch(event)
+
+class RedisBackplane(Backplane):
+    """Redis pub/sub backplane for running several workers or hosts.
+
+    Events are delivered locally right away and published for the other
+    workers; each worker skips its own messages when they come back. If
+    the subscription drops, the listener re-subscribes with backoff and
+    then dispatches a RESUBSCRIBED event, since events published meanwhile
+    are lost to this worker.
+    """
+
+    def __init__(self, url: str, channel: str = "messenger:events"):
+        super().__init__()
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RedisBackplane requires the 'redis' package")
+        self.redis = redis.from_url(url)
+        self.channel = channel
+        self.origin = uuid.uuid4().hex
+        self.pubsub = None
+        self.listener: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await self._subscribe()
+        self.listener = asyncio.create_task(self._listen())
+        logger.info(f"Redis backplane subscribed to {self.channel} as {self.origin}")
+
+    async def _subscribe(self):
+        self.pubsub = self.redis.pubsub()
+        await self.pubsub.subscribe(self.channel)
+
+    async def stop(self):
+        if self.listener:
+            self.listener.cancel()
+        if self.pubsub:
+            await self.pubsub.unsubscribe(self.channel)
+            await self.pubsub.aclose()
+        await self.redis.aclose()
+
+    async def publish(self, event: dict):
+        await self.dispatch(event)
+        await self.redis.publish(
+            self.channel,
+            json.dumps({"origin": self.origin, "event": event})
+        )
+
+    async def _listen(self):
+        delay = settings.backplane_reconnect_min_seconds
+        while True:
+            try:
+                if self.pubsub is None:
+                    await self._subscribe()
+                    logger.info(f"Redis backplane re-subscribed to {self.channel}")
+                    await self.dispatch({"kind": RESUBSCRIBED})
+                async for message in self.pubsub.listen():
+                    delay = settings.backplane_reconnect_min_seconds
+                    await self._receive(message)
+                raise ConnectionError("subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis backplane listener failed, retrying in {delay:.1f}s: {str(e)}")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.backplane_reconnect_max_seconds)
+
+    async def _close_pubsub(self):
+        pubsub, self.pubsub = self.pubsub, None
+        if pubsub is None:
+            return
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def _receive(self, message: dict):
+        if message["type"] != "message":
+            return
+        try:
+            data = json.loads(message["data"])
+        except ValueError:
+            logger.warning("Dropping malformed backplane message")
+            return
+        if data.get("origin") == self.origin:
+            return
+        await self.dispatch(data["event"])
+
+def create_backplane(url: str) -> Backplane:
+    if not url or url.startswith("memory://"):
+        return InProcessBackplane()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBackplane(url)
+    raise ValueError(f"Unsupported backplane URL: {url}")
+
+backplane = create_backplane(settings.backplane_url)
+
+def publish_from_thread(event: dict):
+    # For sync route handlers running in FastAPI's threadpool
+    anyio.from_thread.run(backplane.publish, event)
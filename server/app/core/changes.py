@@ -0,0 +1,128 @@
+import json
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, literal, select
+from sqlalchemy.sql import Executable
+
+from app.db.database import engine
+from app.models.change import ChangeLog
+from app.models.chat import ChatParticipant
+from app.models.message import Message
+
+MESSAGE_CREATED = "message_created"
+MESSAGE_EDITED = "message_edited"
+MESSAGE_DELETED = "message_deleted"
+MESSAGES_READ = "messages_read"
+MEMBER_ADDED = "member_added"
+MEMBER_REMOVED = "member_removed"
+CHAT_RENAMED = "chat_renamed"
+CHAT_DELETED = "chat_deleted"
+
+# Each function below returns statements that append to the change log.
+# Like chat_summary, callers run them in the transaction of the write
+# itself, so the log holds exactly the committed changes.
+
+# Seqs must become visible in order: a reader that has seen seq n must never
+# later find a smaller one. SQLite holds one write lock until commit, so
+# that already holds. Postgres hands out sequence values to concurrent
+# transactions that commit in any order, so there appending takes a
+# transaction-level advisory lock first, held until commit.
+SERIALIZE_APPENDS = engine.dialect.name == "postgresql"
+# Arbitrary, but unique among the app's advisory locks
+APPEND_LOCK_ID = 0x6368616E6765
+
+def _entry(kind: str, chat_id: int, user_id: Optional[int] = None, message_id: Optional[int] = None, data: Optional[dict] = None) -> dict:
+    return {
+        "kind": kind,
+        "chat_id": chat_id,
+        "user_id": user_id,
+        "message_id": message_id,
+        "data": json.dumps(data, separators=(",", ":"), ensure_ascii=False) if data is not None else None,
+        "created_at": datetime.utcnow(),
+    }
+
+def _lock() -> List[Executable]:
+    return [select(func.pg_advisory_xact_lock(APPEND_LOCK_ID))] if SERIALIZE_APPENDS else []
+
+def _append(entries: List[dict]) -> List[Executable]:
+    return _lock() + [insert(ChangeLog).values(entries)] if entries else []
+
+def _snapshot(message: Message) -> dict:
+    return {
+        "content": message.content,
+        "id": message.id,
+        "chat_id": message.chat_id,
+        "sender_id": message.sender_id,
+        "created_at": message.created_at.isoformat(),
+        "read": bool(message.read),
+    }
+
+def messages_created(messages: Iterable[Message]) -> List[Executable]:
+    return _append([
+        _entry(MESSAGE_CREATED, message.chat_id, message_id=message.id, data=_snapshot(message))
+        for message in messages
+    ])
+
+def message_edited(message: Message) -> List[Executable]:
+    return _append([_entry(MESSAGE_EDITED, message.chat_id, message_id=message.id, data=_snapshot(message))])
+
+def message_deleted(message: Message) -> List[Executable]:
+    return _append([_entry(MESSAGE_DELETED, message.chat_id, message_id=message.id)])
+
+def messages_read(chat_id: int, user_id: int, up_to_id: int) -> List[Executable]:
+    return _append([_entry(MESSAGES_READ, chat_id, user_id=user_id, message_id=up_to_id)])
+
+def members_added(chat_id: int, user_ids: Iterable[int]) -> List[Executable]:
+    return _append([_entry(MEMBER_ADDED, chat_id, user_id=user_id) for user_id in user_ids])
+
+def members_removed(chat_id: int, user_ids: Iterable[int]) -> List[Executable]:
+    return _append([_entry(MEMBER_REMOVED, chat_id, user_id=user_id) for user_id in user_ids])
+
+def chat_renamed(chat_id: int, name: str) -> List[Executable]:
+    return _append([_entry(CHAT_RENAMED, chat_id, data={"name": name})])
+
+def chat_deleted(chat_id: int) -> List[Executable]:
+    # One entry per member, addressed to them: the chat is no longer among
+    # their chats, so they would not see it through chat_id. Run it before
+    # the participants are deleted.
+    return _lock() + [
+        insert(ChangeLog).from_select(
+            ["kind", "chat_id", "user_id", "created_at"],
+            select(
+                literal(CHAT_DELETED),
+                ChatParticipant.chat_id,
+                ChatParticipant.user_id,
+                literal(datetime.utcnow(), ChangeLog.created_at.type),
+            ).where(ChatParticipant.chat_id == chat_id)
+        )
+    ]
+
+def _compaction_key(entry: ChangeLog) -> Tuple:
+    if entry.kind in (MESSAGE_CREATED, MESSAGE_EDITED, MESSAGE_DELETED):
+        return ("message", entry.message_id)
+    if entry.kind in (MEMBER_ADDED, MEMBER_REMOVED):
+        return ("member", entry.chat_id, entry.user_id)
+    return (entry.kind, entry.chat_id, entry.user_id)
+
+def compact(entries: List[ChangeLog]) -> List[dict]:
+    """Keep only the latest change per message, member, reader and chat name.
+
+    Entries must be in seq order; the result stays in seq order of the
+    changes that are kept.
+    """
+    latest: Dict[Tuple, ChangeLog] = {}
+    for entry in entries:
+        latest.pop(_compaction_key(entry), None)
+        latest[_compaction_key(entry)] = entry
+    return [
+        {
+            "seq": entry.seq,
+            "type": entry.kind,
+            "chat_id": entry.chat_id,
+            "user_id": entry.user_id,
+            "message_id": entry.message_id,
+            "data": json.loads(entry.data) if entry.data is not None else None,
+        }
+        for entry in latest.values()
+    ]
@@ -0,0 +1,175 @@
+from typing import Callable, Dict, Iterable, List
+
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Executable
+
+from app.core import changes, versions
+from app.models.chat import Chat, ChatParticipant
+from app.models.message import Message
+
+# Chat list previews are cut to this many characters
+PREVIEW_LENGTH = 200
+
+# Columns that trigger a full rebuild when they are added to an existing database
+SUMMARY_COLUMNS = {
+    "chats.last_message_id",
+    "chat_participants.unread_count",
+    "chat_participants.last_activity_at",
+}
+
+# Statements that keep the chat summary in step with a write; callers run them in the write's transaction
+
+def preview(content: str) -> str:
+    return (content or "")[:PREVIEW_LENGTH]
+
+def messages_inserted(messages: List[Message]) -> List[Executable]:
+    statements = []
+    by_chat: Dict[int, List[Message]] = {}
+    for message in messages:
+        by_chat.setdefault(message.chat_id, []).append(message)
+    
+    for chat_id, chat_messages in by_chat.items():
+        last = max(chat_messages, key=lambda m: m.id)
+        statements.append(
+            update(Chat)
+            .where(Chat.id == chat_id)
+            .where(or_(Chat.last_message_id.is_(None), Chat.last_message_id < last.id))
+            .values(
+                last_message_id=last.id,
+                last_message_sender_id=last.sender_id,
+                last_message_preview=preview(last.content),
+                last_message_at=last.created_at,
+            )
+        )
+        
+        # Everyone but the sender gains one unread message per message
+        sent_by: Dict[int, int] = {}
+        for message in chat_messages:
+            sent_by[message.sender_id] = sent_by.get(message.sender_id, 0) + 1
+        total = len(chat_messages)
+        increment = case(
+            *[(ChatParticipant.user_id == sender_id, total - count) for sender_id, count in sent_by.items()],
+            else_=total
+        )
+        statements.append(
+            update(ChatParticipant)
+            .where(ChatParticipant.chat_id == chat_id)
+            .values(
+                unread_count=func.coalesce(ChatParticipant.unread_count, 0) + increment,
+                last_activity_at=last.created_at,
+            )
+        )
+    return statements + versions.chats_changed(by_chat) + changes.messages_created(messages)
+
+def message_edited(message: Message) -> List[Executable]:
+    return [
+        update(Chat)
+        .where(Chat.id == message.chat_id, Chat.last_message_id == message.id)
+        .values(last_message_preview=preview(message.content))
+    ] + versions.chats_changed([message.chat_id]) + changes.message_edited(message)
+
+def message_deleted(message: Message) -> List[Executable]:
+    # Run after the DELETE: the chat falls back to its newest remaining message
+    latest_id = (
+        select(Message.id)
+        .where(Message.chat_id == message.chat_id)
+        .order_by(Message.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    return [
+        update(Chat)
+        .where(Chat.id == message.chat_id, Chat.last_message_id == message.id)
+        .values(
+            last_message_id=latest_id,
+            last_message_sender_id=select(Message.sender_id).where(Message.id == latest_id).scalar_subquery(),
+            last_message_preview=select(func.substr(Message.content, 1, PREVIEW_LENGTH)).where(Message.id == latest_id).scalar_subquery(),
+            last_message_at=select(Message.created_at).where(Message.id == latest_id).scalar_subquery(),
+        ),
+        update(ChatParticipant)
+        .where(
+            ChatParticipant.chat_id == message.chat_id,
+            ChatParticipant.user_id != message.sender_id,
+            ChatParticipant.unread_count > 0,
+            or_(
+                ChatParticipant.last_read_message_id.is_(None),
+                ChatParticipant.last_read_message_id < message.id
+            )
+        )
+        .values(unread_count=ChatParticipant.unread_count - 1),
+    ] + versions.chats_changed([message.chat_id]) + changes.message_deleted(message)
+
+def messages_read(chat_id: int, user_id: int, up_to_id: int, last_message_id: int) -> List[Executable]:
+    participant = and_(ChatParticipant.chat_id == chat_id, ChatParticipant.user_id == user_id)
+    if up_to_id >= last_message_id:
+        unread = 0
+    else:
+        # Partial read: count what is left above the watermark
+        unread = (
+            select(func.count(Message.id))
+            .where(
+                Message.chat_id == chat_id,
+                Message.id > up_to_id,
+                Message.sender_id != user_id
+            )
+            .scalar_subquery()
+        )
+    return (
+        [update(ChatParticipant).where(participant).values(unread_count=unread)]
+        # Watermarks are part of the chat and its history (read flags)
+        + versions.chats_changed([chat_id])
+        + changes.messages_read(chat_id, user_id, up_to_id)
+    )
+
+def read_watermarks(db: Session, chat_ids: Iterable[int]) -> Dict[int, Dict[int, int]]:
+    """Map of chat_id -> {user_id: last_read_message_id} for members who read anything."""
+    watermarks: Dict[int, Dict[int, int]] = {}
+    rows = db.execute(
+        select(ChatParticipant.chat_id, ChatParticipant.user_id, ChatParticipant.last_read_message_id)
+        .where(ChatParticipant.chat_id.in_(list(chat_ids)), ChatParticipant.last_read_message_id.is_not(None))
+    )
+    for chat_id, user_id, last_read_message_id in rows:
+        watermarks.setdefault(chat_id, {})[user_id] = last_read_message_id
+    return watermarks
+
+def read_check(watermarks: Dict[int, int]) -> Callable[[int, int], bool]:
+    """is_read(message_id, sender_id): has anyone but the sender read up to it?"""
+    # The highest two watermarks are enough: at most one is the sender's
+    top = sorted(watermarks.items(), key=lambda item: item[1], reverse=True)[:2]
+    def is_read(message_id: int, sender_id: int) -> bool:
+        return any(up_to_id >= message_id for user_id, up_to_id in top if user_id != sender_id)
+    return is_read
+
+def rebuild_chat_summaries(db: Session):
+    """Recompute every summary from scratch (used to backfill old databases)."""
+    latest_id = (
+        select(func.max(Message.id))
+        .where(Message.chat_id == Chat.id)
+        .correlate(Chat)
+        .scalar_subquery()
+    )
+    db.execute(update(Chat).values(last_message_id=latest_id))
+    db.execute(update(Chat).values(
+        last_message_sender_id=select(Message.sender_id).where(Message.id == Chat.last_message_id).scalar_subquery(),
+        last_message_preview=select(func.substr(Message.content, 1, PREVIEW_LENGTH)).where(Message.id == Chat.last_message_id).scalar_subquery(),
+        last_message_at=select(Message.created_at).where(Message.id == Chat.last_message_id).scalar_subquery(),
+    ))
+    unread = (
+        select(func.count(Message.id))
+        .where(
+            Message.chat_id == ChatParticipant.chat_id,
+            Message.id > func.coalesce(ChatParticipant.last_read_message_id, 0),
+            Message.sender_id != ChatParticipant.user_id
+        )
+        .correlate(ChatParticipant)
+        .scalar_subquery()
+    )
+    last_activity = (
+        select(func.coalesce(Chat.last_message_at, Chat.created_at))
+        .where(Chat.id == ChatParticipant.chat_id)
+        .correlate(ChatParticipant)
+        .scalar_subquery()
+    )
+    db.execute(update(ChatParticipant).values(unread_count=unread, last_activity_at=last_activity))
+    db.commit()
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Any, Dict, List
 
 class Settings(BaseSettings):
     # Объединяем все поля и убираем дубликаты
@@ -10,6 +10,11 @@ class Settings(BaseSettings):
         "http://127.0.0.1:8080",
     ]
     database_url: str = "sqlite:///./chat.db"
+    # Storage tuning for the database's dialect (see app/db/profiles.py):
+    # "baseline", "durable", "balanced" or "throughput". Overrides are merged
+    # on top, e.g. {"busy_timeout": 20000} or {"pool_size": 50}.
+    storage_profile: str = "balanced"
+    storage_profile_overrides: Dict[str, Any] = {}
     secret_key: str = "supersecretkey"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 10080  # 7 дней в минутах
@@ -17,6 +22,94 @@ class Settings(BaseSettings):
     debug: bool = False
     environment: str = "development"
 
+    # WebSocket fan-out: per-connection outbound queue and send deadline
+    ws_send_queue_size: int = 256
+    ws_send_timeout_seconds: float = 5.0
+    # Resumable sessions: events kept per user, and how long a user's buffer
+    # outlives their last socket before a reconnect needs a full resync
+    ws_replay_buffer_size: int = 512
+    ws_resume_window_seconds: float = 120.0
+    # Offer permessage-deflate to clients (negotiated by the WebSocket
+    # handshake). Saves egress on text-heavy JSON at some CPU cost.
+    # Pass --ws-per-message-deflate to uvicorn when not starting via main.py.
+    ws_per_message_deflate: bool = True
+
+    # Inbound WS rate limits as {"event type": [rate per second, burst]},
+    # per connection and per user ("default" covers unlisted types). Over the
+    # limit an event is dropped, delayed (up to max_delay, beyond which the
+    # socket is closed) or the socket is closed with 1008.
+    ws_connection_rate_limits: Dict[str, List[float]] = {
+        "message": [5, 20],
+        "mark_read": [5, 20],
+        "typing": [5, 10],
+        "default": [2, 10],
+    }
+    ws_user_rate_limits: Dict[str, List[float]] = {
+        "message": [10, 40],
+        "mark_read": [10, 40],
+        "typing": [10, 20],
+    }
+    ws_rate_limit_actions: Dict[str, str] = {
+        "message": "delay",
+        "mark_read": "drop",
+        "typing": "drop",
+        "default": "drop",
+    }
+    ws_rate_limit_max_delay_seconds: float = 2.0
+    # Typing updates reach a chat at most once per user per interval
+    ws_typing_interval_seconds: float = 1.0
+
+    # Cross-worker event delivery: "memory://" for a single worker,
+    # "redis://host:6379/0" when running several workers or hosts
+    backplane_url: str = "memory://"
+    # After a lost Redis connection the listener re-subscribes, waiting
+    # from min to max seconds, doubling per failed attempt
+    backplane_reconnect_min_seconds: float = 0.5
+    backplane_reconnect_max_seconds: float = 30.0
+
+    # Group commit for incoming WS messages: a batch is written once it is
+    # full or its oldest message has waited max_delay_ms (the latency budget)
+    message_batch_max_size: int = 256
+    message_batch_max_delay_ms: float = 5.0
+    message_ingest_queue_size: int = 10000
+
+    # Caches for verified tokens and user identity rows used by get_current_user.
+    # The TTL bounds staleness on other workers after a user is changed.
+    auth_token_cache_size: int = 10000
+    auth_user_cache_size: int = 10000
+    auth_cache_ttl_seconds: float = 60.0
+
+    # bcrypt runs on a dedicated process pool. Jobs beyond max_pending are
+    # rejected with 503 + Retry-After. Changing bcrypt_rounds rehashes stored
+    # passwords on the next successful login.
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 64
+    password_hash_retry_after_seconds: int = 2
+
+    # Presence: a user is reported offline only after their last socket has
+    # been closed for the grace period; changes go out once per flush interval
+    presence_offline_grace_seconds: float = 5.0
+    presence_flush_interval_ms: float = 1000.0
+
+    # Interval at which event-loop lag is sampled for /api/metrics
+    metrics_loop_lag_interval_seconds: float = 0.5
+
+    # Cold-history archival: messages older than archive_after_days move out
+    # of the messages table into compressed per-chat segment files under
+    # archive_dir (0 disables it). Pages are served from them transparently.
+    archive_dir: str = "./archive"
+    archive_after_days: float = 0
+    archive_interval_seconds: float = 3600.0
+    archive_segment_max_messages: int = 10000
+    archive_block_size: int = 128
+    archive_block_cache_size: int = 512
+    archive_block_cache_ttl_seconds: float = 300.0
+
+    # Postgres text search configuration for the message search index
+    # ("simple" does no stemming, which suits mixed-language chats)
+    search_text_config: str = "simple"
+
     # Новая конфигурация (ЗАМЕНЯЕТ старый класс Config)
     model_config = SettingsConfigDict(
         env_file=".env",
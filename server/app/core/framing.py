@@ -0,0 +1,75 @@
+import json
+from typing import Dict, Optional, Tuple, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+
+# Sec-WebSocket-Protocol values a client may offer, most preferred first
+SUBPROTOCOLS = {
+    "messenger.msgpack": MSGPACK,
+    "messenger.json": JSON,
+}
+
+def negotiate(websocket: WebSocket) -> Tuple[Optional[str], str]:
+    """Pick the subprotocol to accept and the encoding it implies.
+
+    Clients that offer nothing we know (including plain browsers) get JSON
+    text frames, as before.
+    """
+    for subprotocol in websocket.scope.get("subprotocols", []):
+        encoding = SUBPROTOCOLS.get(subprotocol)
+        if encoding == MSGPACK and msgpack is None:
+            continue
+        if encoding is not None:
+            return subprotocol, encoding
+    return None, JSON
+
+def encode(message: dict, encoding: str) -> Union[str, bytes]:
+    if encoding == MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    # Same output as WebSocket.send_json
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+class OutboundFrame:
+    """An event on its way to one or more sockets.
+
+    The encoded form is computed on first use and shared by every socket
+    using that encoding, so fan-out to N recipients serializes once.
+    """
+
+    __slots__ = ("message", "_encoded")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self._encoded: Dict[str, Union[str, bytes]] = {}
+
+    def encode(self, encoding: str) -> Union[str, bytes]:
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = encode(self.message, encoding)
+        return data
+
+async def send_frame(websocket: WebSocket, frame: OutboundFrame, encoding: str):
+    data = frame.encode(encoding)
+    if isinstance(data, bytes):
+        await websocket.send_bytes(data)
+    else:
+        await websocket.send_text(data)
+
+async def receive_frame(websocket: WebSocket) -> dict:
+    """Next client frame: JSON text, or MessagePack in a binary frame."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        if msgpack is None:
+            raise ValueError("Binary frames require the 'msgpack' package")
+        return msgpack.unpackb(message["bytes"], raw=False)
+    return json.loads(message["text"])
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from app.core import chat_summary, metrics
+from app.core.config import settings
+from app.core.search import search_index
+from app.db.database import AsyncSessionLocal
+from app.models.message import Message
+
+logger = logging.getLogger(__name__)
+
+class MessageIngestor:
+    """Group-commit pipeline for chat messages arriving over WebSockets.
+
+    Messages are buffered until the oldest one has waited
+    message_batch_max_delay_ms or message_batch_max_size are pending, then
+    written in a single transaction. Once committed (and ids assigned) the
+    whole batch is handed to on_committed for fan-out. If the batch fails,
+    each message is retried in its own transaction so one bad row cannot
+    take the others down; those that still fail go to on_failed.
+    """
+
+    def __init__(
+        self,
+        on_committed: Callable[[List[Message]], Awaitable[None]],
+        on_failed: Callable[[List[Message]], Awaitable[None]]
+    ):
+        self.on_committed = on_committed
+        self.on_failed = on_failed
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.message_ingest_queue_size)
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        # Let everything already accepted reach the database first
+        await self.queue.join()
+        self.task.cancel()
+        self.task = None
+
+    async def submit(self, chat_id: int, sender_id: int, content: str):
+        message = Message(
+            chat_id=chat_id,
+            sender_id=sender_id,
+            content=content,
+            created_at=datetime.utcnow(),
+            read=False
+        )
+        # Blocks only when the pipeline is saturated, which backpressures the sender
+        await self.queue.put(message)
+
+    async def _run(self):
+        metrics.set_route("ws:ingest")
+        loop = asyncio.get_running_loop()
+        max_delay = settings.message_batch_max_delay_ms / 1000
+        max_size = settings.message_batch_max_size
+        
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + max_delay
+            
+            while len(batch) < max_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write(self, batch: List[Message]):
+        async with AsyncSessionLocal() as db:
+            # One transaction; Postgres gets a multi-row INSERT ... RETURNING,
+            # SQLite one INSERT per row (it can't order RETURNING rows)
+            db.add_all(batch)
+            await db.flush()
+            for statement in chat_summary.messages_inserted(batch) + search_index.messages_indexed(batch):
+                await db.execute(statement)
+            await db.commit()
+
+    async def _flush(self, batch: List[Message]):
+        committed, failed = batch, []
+        try:
+            await self._write(batch)
+        except Exception as e:
+            logger.error(f"Failed to write batch of {len(batch)} messages, retrying one by one: {str(e)}")
+            committed = []
+            for message in batch:
+                # A fresh object: the rolled-back one may still hold an id
+                message = Message(
+                    chat_id=message.chat_id,
+                    sender_id=message.sender_id,
+                    content=message.content,
+                    created_at=message.created_at,
+                    read=False
+                )
+                try:
+                    await self._write([message])
+                    committed.append(message)
+                except Exception as e:
+                    logger.error(f"Failed to write message from user {message.sender_id} to chat {message.chat_id}: {str(e)}")
+                    failed.append(message)
+        
+        try:
+            if committed:
+                await self.on_committed(committed)
+            if failed:
+                await self.on_failed(failed)
+        except Exception as e:
+            logger.error(f"Fan-out of {len(batch)} ingested messages failed: {str(e)}")
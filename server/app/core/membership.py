@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import threading
+from typing import Dict, FrozenSet, Iterable, Set
+from sqlalchemy.orm import Session
+
+from app.core.backplane import publish_from_thread
+from app.models.chat import Chat, ChatParticipant
+
+logger = logging.getLogger(__name__)
+
+class MembershipIndex:
+    """Process-local chat_id <-> user_id membership sets.
+
+    Warmed once at startup and kept current by the chat routes, so
+    authorization checks and recipient lookups never hit the database.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Map of chat_id -> member user ids
+        self.chat_members: Dict[int, Set[int]] = {}
+        # Map of user_id -> chat ids the user belongs to
+        self.user_chats: Dict[int, Set[int]] = {}
+
+    def load(self, db: Session):
+        chat_members: Dict[int, Set[int]] = {}
+        user_chats: Dict[int, Set[int]] = {}
+        for (chat_id,) in db.query(Chat.id):
+            chat_members[chat_id] = set()
+        for chat_id, user_id in db.query(ChatParticipant.chat_id, ChatParticipant.user_id):
+            chat_members.setdefault(chat_id, set()).add(user_id)
+            user_chats.setdefault(user_id, set()).add(chat_id)
+        with self._lock:
+            self.chat_members = chat_members
+            self.user_chats = user_chats
+        logger.info(f"Membership index loaded: {len(chat_members)} chats, {len(user_chats)} users")
+
+    def add_chat(self, chat_id: int, user_ids: Iterable[int] = ()):
+        with self._lock:
+            self.chat_members.setdefault(chat_id, set())
+            for user_id in user_ids:
+                self._add(chat_id, user_id)
+
+    def add_members(self, chat_id: int, user_ids: Iterable[int]):
+        with self._lock:
+            for user_id in user_ids:
+                self._add(chat_id, user_id)
+
+    def remove_members(self, chat_id: int, user_ids: Iterable[int]):
+        with self._lock:
+            for user_id in user_ids:
+                self._remove(chat_id, user_id)
+
+    def remove_chat(self, chat_id: int):
+        with self._lock:
+            for user_id in self.chat_members.pop(chat_id, set()):
+                chats = self.user_chats.get(user_id)
+                if chats is not None:
+                    chats.discard(chat_id)
+                    if not chats:
+                        del self.user_chats[user_id]
+
+    async def reload(self, event: dict):
+        # After a backplane outage: changes made on other workers were missed
+        from app.db.database import SessionLocal
+
+        def load():
+            db = SessionLocal()
+            try:
+                self.load(db)
+            finally:
+                db.close()
+
+        await asyncio.to_thread(load)
+
+    async def apply_event(self, event: dict):
+        # Membership changes made on any worker, delivered via the backplane
+        op = event["op"]
+        chat_id = event["chat_id"]
+        user_ids = event.get("user_ids", [])
+        if op == "add_chat":
+            self.add_chat(chat_id, user_ids)
+        elif op == "add_members":
+            self.add_members(chat_id, user_ids)
+        elif op == "remove_members":
+            self.remove_members(chat_id, user_ids)
+        elif op == "remove_chat":
+            self.remove_chat(chat_id)
+        else:
+            logger.warning(f"Unknown membership op: {op}")
+
+    def has_chat(self, chat_id: int) -> bool:
+        return chat_id in self.chat_members
+
+    def is_member(self, chat_id: int, user_id: int) -> bool:
+        members = self.chat_members.get(chat_id)
+        return members is not None and user_id in members
+
+    def members(self, chat_id: int) -> FrozenSet[int]:
+        with self._lock:
+            return frozenset(self.chat_members.get(chat_id, ()))
+
+    def chats_of(self, user_id: int) -> FrozenSet[int]:
+        with self._lock:
+            return frozenset(self.user_chats.get(user_id, ()))
+
+    def contacts_of(self, user_id: int) -> Set[int]:
+        """Everyone who shares at least one chat with the user."""
+        with self._lock:
+            contacts: Set[int] = set()
+            for chat_id in self.user_chats.get(user_id, ()):
+                contacts.update(self.chat_members.get(chat_id, ()))
+        contacts.discard(user_id)
+        return contacts
+
+    def _add(self, chat_id: int, user_id: int):
+        self.chat_members.setdefault(chat_id, set()).add(user_id)
+        self.user_chats.setdefault(user_id, set()).add(chat_id)
+
+    def _remove(self, chat_id: int, user_id: int):
+        members = self.chat_members.get(chat_id)
+        if members is not None:
+            members.discard(user_id)
+        chats = self.user_chats.get(user_id)
+        if chats is not None:
+            chats.discard(chat_id)
+            if not chats:
+                del self.user_chats[user_id]
+
+membership_index = MembershipIndex()
+
+def publish_membership_change(op: str, chat_id: int, user_ids: Iterable[int] = ()):
+    """Apply a membership change on every worker (this one included)."""
+    publish_from_thread({
+        "kind": "membership",
+        "op": op,
+        "chat_id": chat_id,
+        "user_ids": list(user_ids),
+    })
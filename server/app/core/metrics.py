@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple, Union
+
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Sub-millisecond buckets: most of what we time here is in-process work
+FAST_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+# Inbound event types get a label of their own; anything else is "other"
+WS_EVENT_TYPES = {"message", "mark_read", "typing", "heartbeat"}
+
+WS_HANDLE_SECONDS = Histogram(
+    "ws_handle_message_seconds",
+    "Time spent in handle_message, by event type",
+    ["type"],
+    buckets=FAST_BUCKETS,
+)
+WS_FANOUT_RECIPIENTS = Histogram(
+    "ws_fanout_recipients",
+    "Users with a session on this worker per delivered event",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+)
+DB_QUERIES = Counter(
+    "db_queries_total",
+    "SQL statements executed, by route (endpoint name)",
+    ["route"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "SQL statement latency, by route",
+    ["route"],
+    buckets=FAST_BUCKETS,
+)
+DB_COMMIT_SECONDS = Histogram(
+    "db_commit_seconds",
+    "Session commit latency including the final flush, by route",
+    ["route"],
+    buckets=FAST_BUCKETS,
+)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds",
+    "Time spent waiting for a pooled connection, by engine",
+    ["engine"],
+    buckets=FAST_BUCKETS,
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a callback scheduled at a fixed interval",
+    buckets=FAST_BUCKETS,
+)
+
+# Either an HTTP scope (the matched endpoint is read from it lazily, once
+# the router has filled it in) or a fixed label such as "ws:message"
+_route: ContextVar[Union[dict, str, None]] = ContextVar("metrics_route", default=None)
+
+def set_route(source: Union[dict, str]):
+    return _route.set(source)
+
+def reset_route(token):
+    _route.reset(token)
+
+def current_route() -> str:
+    source = _route.get()
+    if source is None:
+        return "background"
+    if isinstance(source, str):
+        return source
+    endpoint = source.get("endpoint")
+    return getattr(endpoint, "__name__", "unmatched")
+
+def ws_event_label(message_type) -> str:
+    return message_type if message_type in WS_EVENT_TYPES else "other"
+
+def instrument_engine(engine: Engine):
+    """Count and time every statement run through the engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        route = current_route()
+        DB_QUERIES.labels(route).inc()
+        DB_QUERY_SECONDS.labels(route).observe(time.perf_counter() - context._metrics_started)
+
+@event.listens_for(Session, "before_commit")
+def _commit_started(session):
+    session.info["metrics_commit_started"] = time.perf_counter()
+
+@event.listens_for(Session, "after_commit")
+def _commit_finished(session):
+    started = session.info.pop("metrics_commit_started", None)
+    if started is not None:
+        DB_COMMIT_SECONDS.labels(current_route()).observe(time.perf_counter() - started)
+
+class ScrapeCollector:
+    """Gauges computed only when /api/metrics is scraped.
+
+    Each callback returns either a number or a {label value: number} dict
+    for a gauge with a single label, so nothing is maintained on hot paths.
+    """
+
+    def __init__(self):
+        self.gauges: List[Tuple[str, str, Optional[str], Callable]] = []
+
+    def gauge(self, name: str, documentation: str, callback: Callable, label: Optional[str] = None):
+        self.gauges.append((name, documentation, label, callback))
+
+    def collect(self):
+        for name, documentation, label, callback in self.gauges:
+            try:
+                value = callback()
+            except Exception as e:
+                logger.error(f"Metric {name} failed: {str(e)}")
+                continue
+            if label is None:
+                yield GaugeMetricFamily(name, documentation, value=value)
+                continue
+            family = GaugeMetricFamily(name, documentation, labels=[label])
+            for label_value, sample in value.items():
+                family.add_metric([str(label_value)], sample)
+            yield family
+
+scrape_collector = ScrapeCollector()
+REGISTRY.register(scrape_collector)
+
+class LoopLagMonitor:
+    """Samples event-loop lag by sleeping a fixed interval and timing the overshoot."""
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.last_lag = 0.0
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
+
+    async def _run(self):
+        interval = settings.metrics_loop_lag_interval_seconds
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.last_lag = max(0.0, loop.time() - started - interval)
+            EVENT_LOOP_LAG_SECONDS.observe(self.last_lag)
+
+loop_lag_monitor = LoopLagMonitor()
@@ -0,0 +1,36 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException
+
+# Response header carrying the opaque cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_token(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_token(token: str) -> dict:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return data
+
+def encode_cursor(direction: str, created_at: datetime, row_id: int) -> str:
+    return encode_token({"d": direction, "t": created_at.isoformat(), "id": row_id})
+
+def decode_cursor(cursor: str) -> Tuple[str, datetime, int]:
+    data = decode_token(cursor)
+    try:
+        direction = data["d"]
+        if direction not in ("before", "after"):
+            raise ValueError(direction)
+        return direction, datetime.fromisoformat(data["t"]), int(data["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
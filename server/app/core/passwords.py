@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_pwd_context: Optional[CryptContext] = None
+
+def get_pwd_context() -> CryptContext:
+    # Built lazily in each worker process. Pinning min and max rounds to the
+    # configured cost makes verify_and_update() flag hashes made at any other cost
+    global _pwd_context
+    if _pwd_context is None:
+        rounds = settings.bcrypt_rounds
+        _pwd_context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds,
+        )
+    return _pwd_context
+
+def _hash(password: str) -> str:
+    return get_pwd_context().hash(password)
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return get_pwd_context().verify_and_update(password, hashed_password)
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated, bounded process pool.
+
+    At most password_hash_max_pending jobs may be queued or running; beyond
+    that callers get a 503 with Retry-After instead of an unbounded queue,
+    so a login storm cannot starve FastAPI's shared threadpool.
+    """
+
+    def __init__(self):
+        self.executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self):
+        workers = settings.password_hash_workers
+        if workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+        else:
+            # Development/tests: a small private thread pool instead of processes
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="password-hash")
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash
+        was made with outdated cost parameters and should be replaced."""
+        if not hashed_password:
+            return False, None
+        valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        if new_hash:
+            self.rehashed += 1
+        return valid, new_hash
+
+    async def _run(self, func, *args):
+        with self._lock:
+            if self.pending >= settings.password_hash_max_pending:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please retry shortly",
+                    headers={"Retry-After": str(settings.password_hash_retry_after_seconds)},
+                )
+            self.pending += 1
+        
+        if self.executor is None:
+            self.start()
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            latency = time.perf_counter() - started
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_latency += latency
+                self.max_latency = max(self.max_latency, latency)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_latency_ms": (self.total_latency / self.completed * 1000) if self.completed else 0.0,
+            "max_latency_ms": self.max_latency * 1000,
+        }
+
+password_hasher = PasswordHasher()
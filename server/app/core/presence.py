@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional, Set, TYPE_CHECKING
+
+from app.core.config import settings
+from app.core.membership import membership_index
+
+if TYPE_CHECKING:
+    from app.core.websocket import ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+def presence_event(updates: List[dict]) -> dict:
+    return {
+        "type": "presence",
+        "updates": updates
+    }
+
+class PresenceService:
+    """Online state and last-seen for users, sent as batched deltas.
+
+    A user goes offline only after their last socket has stayed closed for
+    presence_offline_grace_seconds, so reconnecting clients never flap.
+    Changes of local users are collected and, once per flush interval,
+    published on the backplane as a single event. Every worker folds those
+    into its view (a user is online while any worker holds a socket for
+    them) and sends each local recipient one "presence" frame listing what
+    changed among their contacts.
+    """
+
+    def __init__(self, manager: "ConnectionManager"):
+        self.manager = manager
+        self.worker_id = uuid.uuid4().hex
+        # Map of user_id -> ids of the workers the user has sockets on
+        self.online_workers: Dict[int, Set[str]] = {}
+        # Map of user_id -> ISO timestamp of when they were last seen
+        self.last_seen: Dict[int, str] = {}
+        # Local users whose state may have changed since the last flush
+        self._dirty: Set[int] = set()
+        # Local users this worker last reported as online
+        self._reported: Set[int] = set()
+        # Debounced offline transitions, cancelled when the user reconnects
+        self._offline_timers: Dict[int, asyncio.TimerHandle] = {}
+        self._disconnected_at: Dict[int, datetime] = {}
+        self.task: Optional[asyncio.Task] = None
+        manager.backplane.subscribe("presence", self.apply_event)
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        self.task = None
+        for timer in self._offline_timers.values():
+            timer.cancel()
+        self._offline_timers.clear()
+
+    def connected(self, user_id: int):
+        timer = self._offline_timers.pop(user_id, None)
+        if timer is not None:
+            # Back within the grace period, so the flush finds nothing changed
+            timer.cancel()
+            self._disconnected_at.pop(user_id, None)
+        self._dirty.add(user_id)
+
+    def disconnected(self, user_id: int):
+        if user_id in self._offline_timers:
+            return
+        self._disconnected_at[user_id] = datetime.utcnow()
+        loop = asyncio.get_running_loop()
+        self._offline_timers[user_id] = loop.call_later(
+            settings.presence_offline_grace_seconds, self._grace_expired, user_id
+        )
+
+    def _grace_expired(self, user_id: int):
+        self._offline_timers.pop(user_id, None)
+        self._dirty.add(user_id)
+
+    def is_online(self, user_id: int) -> bool:
+        return bool(self.online_workers.get(user_id))
+
+    def snapshot(self, user_id: int) -> List[dict]:
+        """Current state of the user's contacts, sent when they connect."""
+        return [
+            self._state(contact_id)
+            for contact_id in membership_index.contacts_of(user_id)
+            if self.is_online(contact_id) or contact_id in self.last_seen
+        ]
+
+    def _state(self, user_id: int) -> dict:
+        if self.is_online(user_id):
+            return {"userId": user_id, "isOnline": True}
+        return {"userId": user_id, "isOnline": False, "lastSeen": self.last_seen.get(user_id)}
+
+    async def _run(self):
+        interval = settings.presence_flush_interval_ms / 1000
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Presence flush failed: {str(e)}")
+
+    async def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        updates = []
+        for user_id in dirty:
+            if user_id in self._offline_timers:
+                # Re-marked when the grace period ends or the user returns
+                continue
+            online = self.manager.is_online(user_id)
+            # Several transitions within one interval collapse into the last one
+            if online == (user_id in self._reported):
+                self._disconnected_at.pop(user_id, None)
+                continue
+            if online:
+                self._reported.add(user_id)
+                updates.append({"userId": user_id, "isOnline": True})
+            else:
+                self._reported.discard(user_id)
+                seen_at = self._disconnected_at.pop(user_id, None) or datetime.utcnow()
+                updates.append({"userId": user_id, "isOnline": False, "lastSeen": seen_at.isoformat()})
+        if updates:
+            await self.manager.backplane.publish({
+                "kind": "presence",
+                "worker": self.worker_id,
+                "updates": updates,
+            })
+
+    async def apply_event(self, event: dict):
+        worker = event["worker"]
+        changed = []
+        for update in event["updates"]:
+            user_id = update["userId"]
+            was_online = self.is_online(user_id)
+            if update["isOnline"]:
+                self.online_workers.setdefault(user_id, set()).add(worker)
+            else:
+                workers = self.online_workers.get(user_id)
+                if workers is not None:
+                    workers.discard(worker)
+                    if not workers:
+                        del self.online_workers[user_id]
+                self.last_seen[user_id] = update["lastSeen"]
+            if self.is_online(user_id) != was_online:
+                changed.append(self._state(user_id))
+
+        # Interested users are computed once per change, then each local
+        # recipient gets everything relevant to them in a single frame
+        batches: Dict[int, List[dict]] = {}
+        for update in changed:
+            for contact_id in membership_index.contacts_of(update["userId"]):
+                if self.manager.is_online(contact_id):
+                    batches.setdefault(contact_id, []).append(update)
+        for user_id, batch in batches.items():
+            await self.manager.send_personal_message(presence_event(batch), user_id)
+
+    def stats(self) -> dict:
+        return {
+            "online_users": len(self.online_workers),
+            "pending_offline": len(self._offline_timers),
+        }
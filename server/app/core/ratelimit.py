@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+DROP = "drop"
+DELAY = "delay"
+DISCONNECT = "disconnect"
+
+class TokenBucket:
+    """Allows `rate` events per second on average with bursts up to `burst`.
+
+    Delayed events are admitted on credit, which drives the balance
+    negative so the events after them wait their turn.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+class RateLimiter:
+    """Token buckets per event type for one scope (a connection or a user).
+
+    `limits` maps an event type to [rate per second, burst]; types without
+    an entry share a single "default" bucket, and are unlimited if that is
+    missing. Sharing keeps the number of buckets bounded by the config, not
+    by whatever type strings a client sends.
+    """
+
+    def __init__(self, limits: Dict[str, List[float]]):
+        self.limits = limits
+        self.buckets: Dict[str, Optional[TokenBucket]] = {}
+
+    def key(self, event_type: str) -> str:
+        return event_type if event_type in self.limits else "default"
+
+    def bucket(self, event_type: str) -> Optional[TokenBucket]:
+        key = self.key(event_type)
+        if key not in self.buckets:
+            limit = self.limits.get(key)
+            self.buckets[key] = TokenBucket(*limit) if limit else None
+        return self.buckets[key]
+
+class Coalescer:
+    """Forwards at most one value per key per interval; the latest one wins.
+
+    The first value for a key goes out immediately. Anything submitted
+    during the following interval replaces whatever is pending and is sent
+    when the interval ends, so the final state is never lost.
+    """
+
+    def __init__(self, interval: float, send: Callable[[Hashable, Any], Awaitable[None]]):
+        self.interval = interval
+        self.send = send
+        # Map of key -> pending value (None when nothing is waiting)
+        self._windows: Dict[Hashable, Any] = {}
+        # Sends started from timers; referenced until done so they aren't collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: Hashable, value: Any):
+        if key in self._windows:
+            self._windows[key] = value
+            return
+        self._open(key)
+        await self.send(key, value)
+
+    def _open(self, key: Hashable):
+        self._windows[key] = None
+        asyncio.get_running_loop().call_later(self.interval, self._close, key)
+
+    def _close(self, key: Hashable):
+        value = self._windows.pop(key, None)
+        if value is not None:
+            self._open(key)
+            task = asyncio.create_task(self.send(key, value))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
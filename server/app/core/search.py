@@ -0,0 +1,222 @@
+import logging
+import re
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, bindparam, cast, delete, func, insert, inspect, text
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Executable
+
+from app.core.config import settings
+from app.db.database import engine
+from app.models.message import Message
+
+logger = logging.getLogger(__name__)
+
+# Search tables live outside Base.metadata: their DDL is dialect-specific
+search_metadata = MetaData()
+
+class SearchHit(NamedTuple):
+    message_id: int
+    chat_id: int
+    snippet: str
+    score: float
+
+def _terms(query: str) -> List[str]:
+    return [term for term in re.split(r"\W+", query) if term]
+
+class MessageSearchIndex:
+    """Full-text index over message content, maintained by the write paths.
+
+    Like app.core.chat_summary, the write hooks return statements that the
+    caller executes in the same transaction as the message write itself.
+    Rows carry their own copy of the content and outlive the messages row
+    when it is archived, so archived history stays searchable.
+    """
+
+    table: Table
+    # Column of table holding the message id
+    id_column = "message_id"
+
+    def create(self, bind: Engine):
+        raise NotImplementedError
+
+    def messages_indexed(self, messages: Iterable[Message]) -> List[Executable]:
+        rows = [self._row(message) for message in messages if message.content]
+        if not rows:
+            return []
+        return [insert(self.table).values(rows)]
+
+    def message_edited(self, message: Message) -> List[Executable]:
+        return self.messages_deleted([message.id]) + self.messages_indexed([message])
+
+    def messages_deleted(self, message_ids: Iterable[int]) -> List[Executable]:
+        return [delete(self.table).where(self.table.c[self.id_column].in_(list(message_ids)))]
+
+    def chat_deleted(self, chat_id: int) -> List[Executable]:
+        return [delete(self.table).where(self.table.c.chat_id == chat_id)]
+
+    def search(
+        self,
+        db: Session,
+        query: str,
+        chat_ids: List[int],
+        limit: int,
+        after: Optional[Tuple[float, int]] = None
+    ) -> List[SearchHit]:
+        """Best matches first; after is the (score, message_id) of the last hit seen."""
+        raise NotImplementedError
+
+    def _row(self, message: Message) -> dict:
+        raise NotImplementedError
+
+class SQLiteMessageSearchIndex(MessageSearchIndex):
+    """FTS5 table keyed by message id, ranked with bm25()."""
+
+    id_column = "rowid"
+
+    table = Table(
+        "messages_fts", search_metadata,
+        Column("rowid", Integer, primary_key=True),
+        Column("content", Text),
+        Column("chat_id", Integer),
+    )
+
+    def create(self, bind: Engine):
+        if inspect(bind).has_table("messages_fts"):
+            return
+        with bind.begin() as conn:
+            conn.execute(text(
+                "CREATE VIRTUAL TABLE messages_fts USING fts5("
+                "content, chat_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+            ))
+            # Backfill whatever history already exists
+            conn.execute(text(
+                "INSERT INTO messages_fts(rowid, content, chat_id) "
+                "SELECT id, content, chat_id FROM messages WHERE content IS NOT NULL"
+            ))
+        logger.info("Created FTS5 message search index")
+
+    def _row(self, message: Message) -> dict:
+        return {"rowid": message.id, "content": message.content, "chat_id": message.chat_id}
+
+    def search(self, db, query, chat_ids, limit, after=None):
+        terms = _terms(query)
+        if not terms or not chat_ids:
+            return []
+        # Every term must match; the last one also matches as a prefix
+        match = " ".join('"%s"' % term for term in terms) + "*"
+        
+        sql = (
+            "SELECT id, chat_id, snippet, score FROM ("
+            "  SELECT rowid AS id, chat_id,"
+            "         snippet(messages_fts, 0, '<mark>', '</mark>', '…', 16) AS snippet,"
+            "         -bm25(messages_fts) AS score"
+            "  FROM messages_fts"
+            "  WHERE messages_fts MATCH :match AND chat_id IN :chat_ids"
+            ")"
+        )
+        params = {"match": match, "chat_ids": chat_ids, "limit": limit}
+        if after:
+            sql += " WHERE score < :after_score OR (score = :after_score AND id < :after_id)"
+            params.update(after_score=after[0], after_id=after[1])
+        sql += " ORDER BY score DESC, id DESC LIMIT :limit"
+        
+        statement = text(sql).bindparams(bindparam("chat_ids", expanding=True))
+        return [SearchHit(*row) for row in db.execute(statement, params)]
+
+class PostgresMessageSearchIndex(MessageSearchIndex):
+    """tsvector side table with a GIN index, ranked with ts_rank()."""
+
+    table = Table(
+        "message_search", search_metadata,
+        Column("message_id", Integer, primary_key=True),
+        Column("chat_id", Integer, index=True),
+        Column("content", Text),
+        Column("document", Text),  # tsvector; created by the DDL below
+    )
+
+    def create(self, bind: Engine):
+        inspector = inspect(bind)
+        if inspector.has_table("message_search"):
+            if "content" not in {column["name"] for column in inspector.get_columns("message_search")}:
+                self._keep_archived_rows(bind)
+            return
+        config = settings.search_text_config
+        with bind.begin() as conn:
+            # No foreign key to messages: rows stay when a message is archived
+            conn.execute(text(
+                "CREATE TABLE message_search ("
+                " message_id INTEGER PRIMARY KEY,"
+                " chat_id INTEGER NOT NULL,"
+                " content TEXT NOT NULL,"
+                " document TSVECTOR NOT NULL)"
+            ))
+            conn.execute(text("CREATE INDEX ix_message_search_document ON message_search USING GIN (document)"))
+            conn.execute(text("CREATE INDEX ix_message_search_chat_id ON message_search (chat_id)"))
+            conn.execute(text(
+                "INSERT INTO message_search (message_id, chat_id, content, document) "
+                "SELECT id, chat_id, content, to_tsvector(CAST(:config AS regconfig), content) "
+                "FROM messages WHERE content IS NOT NULL"
+            ), {"config": config})
+        logger.info("Created tsvector message search index")
+
+    def _keep_archived_rows(self, bind: Engine):
+        """Upgrade a table from before archiving kept search rows."""
+        with bind.begin() as conn:
+            conn.execute(text("ALTER TABLE message_search DROP CONSTRAINT IF EXISTS message_search_message_id_fkey"))
+            conn.execute(text("ALTER TABLE message_search ADD COLUMN content TEXT"))
+            conn.execute(text(
+                "UPDATE message_search s SET content = m.content FROM messages m WHERE m.id = s.message_id"
+            ))
+        logger.info("Added content to the tsvector message search index")
+
+    def _row(self, message: Message) -> dict:
+        return {
+            "message_id": message.id,
+            "chat_id": message.chat_id,
+            "content": message.content,
+            "document": func.to_tsvector(cast(settings.search_text_config, REGCONFIG), message.content),
+        }
+
+    def search(self, db, query, chat_ids, limit, after=None):
+        terms = _terms(query)
+        if not terms or not chat_ids:
+            return []
+        # Every term must match; the last one also matches as a prefix
+        tsquery = " & ".join(terms[:-1] + [terms[-1] + ":*"])
+        
+        sql = (
+            "SELECT id, chat_id, snippet, score FROM ("
+            "  SELECT s.message_id AS id, s.chat_id,"
+            "         ts_headline(CAST(:config AS regconfig), s.content, q,"
+            "                     'StartSel=<mark>,StopSel=</mark>,MaxFragments=1,MaxWords=16') AS snippet,"
+            "         ts_rank(s.document, q) AS score"
+            "  FROM message_search s,"
+            "       to_tsquery(CAST(:config AS regconfig), :tsquery) q"
+            "  WHERE s.document @@ q AND s.chat_id IN :chat_ids"
+            ") hits"
+        )
+        params = {
+            "config": settings.search_text_config,
+            "tsquery": tsquery,
+            "chat_ids": chat_ids,
+            "limit": limit,
+        }
+        if after:
+            sql += " WHERE score < :after_score OR (score = :after_score AND id < :after_id)"
+            params.update(after_score=after[0], after_id=after[1])
+        sql += " ORDER BY score DESC, id DESC LIMIT :limit"
+        
+        statement = text(sql).bindparams(bindparam("chat_ids", expanding=True))
+        return [SearchHit(*row) for row in db.execute(statement, params)]
+
+def create_search_index(dialect_name: str) -> MessageSearchIndex:
+    if dialect_name == "sqlite":
+        return SQLiteMessageSearchIndex()
+    if dialect_name == "postgresql":
+        return PostgresMessageSearchIndex()
+    raise ValueError(f"Message search is not supported on {dialect_name}")
+
+search_index = create_search_index(engine.dialect.name)
@@ -0,0 +1,58 @@
+import json
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Any, Iterable, Mapping, Optional, Sequence
+
+from fastapi import Response
+from sqlalchemy import func
+
+from app.models.message import Message
+from app.models.user import User
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Field order matches MessageResponse / UserResponse, so the rendered JSON is
+# byte-for-byte what the response_model path produces for the same rows
+MESSAGE_FIELDS = ("content", "id", "chat_id", "sender_id", "created_at", "read")
+USER_FIELDS = ("username", "email", "id", "created_at")
+
+MESSAGE_COLUMNS = (
+    Message.content,
+    Message.id,
+    Message.chat_id,
+    Message.sender_id,
+    Message.created_at,
+    func.coalesce(Message.read, False).label("read"),
+)
+USER_COLUMNS = (User.username, User.email, User.id, User.created_at)
+
+# Messages that are not ORM objects (archived ones); rows selected with
+# MESSAGE_COLUMNS have the same shape and attribute names
+MessageRow = namedtuple("MessageRow", MESSAGE_FIELDS)
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        # Pydantic writes UTC as "Z"
+        text = value.isoformat()
+        return text[:-6] + "Z" if value.utcoffset() == timezone.utc.utcoffset(None) else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+class RowsResponse(Response):
+    """A JSON list rendered straight from column tuples.
+
+    Skips building ORM objects and validating each one against the
+    response_model; the route keeps response_model for the OpenAPI schema.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, fields: Sequence[str], rows: Iterable[Sequence], headers: Optional[Mapping[str, str]] = None):
+        super().__init__(content=dumps([dict(zip(fields, row)) for row in rows]), headers=headers)
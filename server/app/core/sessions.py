@@ -0,0 +1,97 @@
+import asyncio
+import secrets
+import uuid
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.framing import OutboundFrame
+
+class ReplayBuffer:
+    """The most recent events sent to one user, kept for resuming sockets."""
+
+    def __init__(self, token: str, size: int):
+        self.token = token
+        self.events: Deque[Tuple[int, OutboundFrame]] = deque(maxlen=size)
+        # Highest seq that has fallen out of the buffer
+        self.dropped_through = 0
+        self.expiry: Optional[asyncio.TimerHandle] = None
+
+    def append(self, seq: int, frame: OutboundFrame):
+        if len(self.events) == self.events.maxlen:
+            self.dropped_through = self.events[0][0]
+        self.events.append((seq, frame))
+
+    def since(self, seq: int) -> Optional[List[OutboundFrame]]:
+        """Frames after seq, or None if some of them were already dropped."""
+        if seq < self.dropped_through:
+            return None
+        return [frame for event_seq, frame in self.events if event_seq > seq]
+
+class SessionStore:
+    """Per-user replay buffers for resumable WebSocket sessions.
+
+    Every event this worker delivers gets the next value of a single
+    sequence, so one frame is shared by all of its recipients. A user's
+    buffer lives while they have a socket here and for ws_resume_window_seconds
+    after the last one closes; a client that reconnects within that window
+    with its resume token and last seen seq gets the missed frames replayed.
+    """
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.sessions: Dict[int, ReplayBuffer] = {}
+        self.seq = 0
+
+    def next_seq(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def has_session(self, user_id: int) -> bool:
+        return user_id in self.sessions
+
+    def open(self, user_id: int) -> ReplayBuffer:
+        session = self.sessions.get(user_id)
+        if session is None:
+            # Tokens from another worker or an earlier process never match
+            token = f"{self.worker_id}.{secrets.token_urlsafe(12)}"
+            session = ReplayBuffer(token, settings.ws_replay_buffer_size)
+            self.sessions[user_id] = session
+        elif session.expiry is not None:
+            session.expiry.cancel()
+            session.expiry = None
+        return session
+
+    def resume(self, user_id: int, token: str, last_seq: int) -> Optional[List[OutboundFrame]]:
+        """Frames the client missed, or None if it needs a full resync."""
+        session = self.sessions.get(user_id)
+        if session is None or not secrets.compare_digest(session.token, token):
+            return None
+        if last_seq > self.seq:
+            return None
+        return session.since(last_seq)
+
+    def release(self, user_id: int):
+        # Called when the user's last socket closes
+        session = self.sessions.get(user_id)
+        if session is None or session.expiry is not None:
+            return
+        loop = asyncio.get_running_loop()
+        session.expiry = loop.call_later(
+            settings.ws_resume_window_seconds, self._expire, user_id, session
+        )
+
+    def _expire(self, user_id: int, session: ReplayBuffer):
+        if self.sessions.get(user_id) is session:
+            del self.sessions[user_id]
+
+    def record(self, user_id: int, seq: int, frame: OutboundFrame):
+        session = self.sessions.get(user_id)
+        if session is not None:
+            session.append(seq, frame)
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "seq": self.seq,
+        }
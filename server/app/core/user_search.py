@@ -0,0 +1,115 @@
+import logging
+import re
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Executable
+
+from app.core.membership import membership_index
+from app.models.user import User, UserSearchTerm
+
+logger = logging.getLogger(__name__)
+
+# SUFFIX terms are every suffix of the username and email from the second
+# character on: a substring is a prefix of one of them, so substring
+# matches are served by the same prefix range as everything else
+USERNAME, EMAIL, TOKEN, SUFFIX = 0, 1, 2, 3
+# Shortest suffix indexed (queries are at least this long)
+MIN_SUFFIX_LENGTH = 2
+
+# Index rows scanned per search, in term order (closest terms come first)
+CANDIDATE_LIMIT = 500
+
+def search_terms(username: str, email: str) -> Set[Tuple[str, int]]:
+    username = (username or "").lower()
+    email = (email or "").lower()
+    local_part = email.split("@")[0]
+    terms = {(username, USERNAME), (email, EMAIL), (local_part, EMAIL)}
+    for value in (username, local_part):
+        for token in re.split(r"[\W_]+", value):
+            if token and token != value:
+                terms.add((token, TOKEN))
+    for value in (username, email):
+        for start in range(1, len(value) - MIN_SUFFIX_LENGTH + 1):
+            terms.add((value[start:], SUFFIX))
+    return {(term, field) for term, field in terms if term}
+
+def user_indexed(user: User) -> List[Executable]:
+    """Statements that (re)index a user; run them in the user write's transaction."""
+    rows = [
+        {"term": term, "user_id": user.id, "field": field}
+        for term, field in search_terms(user.username, user.email)
+    ]
+    return [
+        delete(UserSearchTerm).where(UserSearchTerm.user_id == user.id),
+        insert(UserSearchTerm).values(rows),
+    ]
+
+def rebuild_user_search(db: Session):
+    db.execute(delete(UserSearchTerm))
+    rows = []
+    for user_id, username, email in db.execute(select(User.id, User.username, User.email)):
+        rows.extend(
+            {"term": term, "user_id": user_id, "field": field}
+            for term, field in search_terms(username, email)
+        )
+    if rows:
+        db.execute(insert(UserSearchTerm), rows)
+    db.commit()
+    logger.info(f"User search index rebuilt: {len(rows)} terms")
+
+def ensure_user_search(db: Session):
+    # Backfill databases created before the index (or its suffix terms) existed
+    has_terms = db.execute(select(UserSearchTerm.user_id).where(UserSearchTerm.field == SUFFIX).limit(1)).first()
+    has_users = db.execute(select(User.id).limit(1)).first()
+    if has_users and not has_terms:
+        rebuild_user_search(db)
+
+def search_user_ids(db: Session, query: str, current_user_id: int, limit: int) -> List[int]:
+    """Ranked user ids: exact username/email, then username prefix, then email
+    prefix, then prefix of a word inside either, then substring of either.
+    Within each tier people who already share a chat with the caller come
+    first."""
+    q = query.strip().lower()
+    if not q:
+        return []
+    # Prefix range on the term index: q <= term < q with its last char bumped
+    upper = q[:-1] + chr(ord(q[-1]) + 1)
+    
+    def candidates(*criteria):
+        return db.execute(
+            select(UserSearchTerm.term, UserSearchTerm.user_id, UserSearchTerm.field)
+            .where(
+                UserSearchTerm.term >= q,
+                UserSearchTerm.term < upper,
+                UserSearchTerm.user_id != current_user_id,
+                *criteria
+            )
+            .order_by(UserSearchTerm.term)
+            .limit(CANDIDATE_LIMIT)
+        ).all()
+    
+    # Suffixes get their own range so they can't crowd prefix matches out of
+    # the candidate limit, and are only read when the page isn't full
+    rows = candidates(UserSearchTerm.field != SUFFIX)
+    tiers: Dict[int, Tuple[int, str]] = {}
+    for term, user_id, field in rows:
+        if term == q and field != TOKEN:
+            tier = 0
+        else:
+            tier = 1 + field
+        best = tiers.get(user_id)
+        if best is None or (tier, term) < best:
+            tiers[user_id] = (tier, term)
+    
+    if len(tiers) < limit:
+        for term, user_id, field in candidates(UserSearchTerm.field == SUFFIX):
+            tiers.setdefault(user_id, (1 + SUFFIX, term))
+    
+    contacts = membership_index.contacts_of(current_user_id)
+    ranked = sorted(
+        tiers,
+        key=lambda user_id: (tiers[user_id][0], user_id not in contacts, len(tiers[user_id][1]), user_id)
+    )
+    return ranked[:limit]
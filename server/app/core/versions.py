@@ -0,0 +1,80 @@
+from typing import Iterable, List, Optional, Union
+
+from fastapi import Request, Response
+from sqlalchemy import Select, func, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Executable
+
+from app.models.chat import Chat, ChatParticipant
+from app.models.user import User
+
+# Version counters behind the ETags of chat reads. chats.version changes
+# whenever anything shown for the chat or its history changes;
+# users.chat_list_version whenever the set of chats in that user's list
+# does. A chat list's tag adds its chats' versions and unread counts at read
+# time (see list_etag), so a message touches no user rows. Like
+# chat_summary, each function returns statements that callers run in the
+# transaction of the write itself, so a version is never ahead of or behind
+# the data it describes.
+
+# Ids as a list or as a SELECT of ids
+Ids = Union[Iterable[int], Select]
+
+CACHE_CONTROL = "private, no-cache"
+
+def _ids(ids: Ids):
+    return ids if isinstance(ids, Select) else list(ids)
+
+def chat_lists_changed(user_ids: Ids) -> List[Executable]:
+    """Bump the chat list of users who joined or left a chat."""
+    return [
+        update(User)
+        .where(User.id.in_(_ids(user_ids)))
+        # updated_at is left alone: this is not a change to the user
+        .values(chat_list_version=func.coalesce(User.chat_list_version, 0) + 1, updated_at=User.updated_at)
+    ]
+
+def chats_changed(chat_ids: Ids) -> List[Executable]:
+    return [
+        update(Chat)
+        .where(Chat.id.in_(_ids(chat_ids)))
+        .values(version=func.coalesce(Chat.version, 0) + 1)
+    ]
+
+def members_of(chat_id: int) -> Select:
+    return select(ChatParticipant.user_id).where(ChatParticipant.chat_id == chat_id)
+
+def user_renamed(user_id: int) -> List[Executable]:
+    # Participant names are part of every chat the user is in
+    return chats_changed(select(ChatParticipant.chat_id).where(ChatParticipant.user_id == user_id))
+
+def list_etag(db: Session, user_id: int) -> str:
+    # Versions only grow and unread counts only drop without a version bump,
+    # so the sums change with every change to a chat in the list; the list
+    # version covers chats joined or left
+    list_version, chat_count, versions_sum, unread_sum = db.query(
+        select(User.chat_list_version).where(User.id == user_id).scalar_subquery(),
+        func.count(ChatParticipant.chat_id),
+        func.sum(func.coalesce(Chat.version, 0)),
+        func.sum(func.coalesce(ChatParticipant.unread_count, 0)),
+    ).select_from(ChatParticipant).join(
+        Chat, Chat.id == ChatParticipant.chat_id
+    ).filter(ChatParticipant.user_id == user_id).one()
+    return etag("l", user_id, list_version or 0, chat_count, versions_sum or 0, unread_sum or 0)
+
+def etag(*parts) -> str:
+    return '"' + ".".join(str(part) for part in parts) + '"'
+
+def not_modified(request: Request, tag: str) -> Optional[Response]:
+    """A 304 response if the client already has this version, else None."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return None
+    candidates = {candidate.strip().removeprefix("W/") for candidate in header.split(",")}
+    if tag in candidates or "*" in candidates:
+        return Response(status_code=304, headers={"ETag": tag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+def set_etag(response: Response, tag: str):
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = CACHE_CONTROL
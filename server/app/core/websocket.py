@@ -1,145 +1,479 @@
 
+import asyncio
+import itertools
 import logging
 import json
+import time
 from datetime import datetime
-from typing import Dict, Set, Any, List
-from fastapi import WebSocket
-from sqlalchemy.orm import Session
+from typing import Dict, Set, Any, List, Optional, Iterable, Tuple, Union
+from fastapi import WebSocket, status
+from pydantic import ValidationError
+from sqlalchemy import select, update, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import chat_summary, metrics
+from app.core.backplane import Backplane, InProcessBackplane
+from app.core.config import settings
+from app.core.framing import JSON, OutboundFrame, negotiate, send_frame
+from app.core.ingest import MessageIngestor
+from app.core.membership import membership_index
+from app.core.presence import PresenceService, presence_event
+from app.core.ratelimit import DELAY, DISCONNECT, Coalescer, RateLimiter
+from app.core.sessions import SessionStore
 from app.models.message import Message
 from app.models.chat import Chat, ChatParticipant
 from app.models.user import User
+from app.schemas.message import MessageCreate
 
 logger = logging.getLogger(__name__)
 
+_socket_ids = itertools.count(1)
+
+class Connection:
+    """A single WebSocket with its own bounded outbound queue and writer task."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        manager: "ConnectionManager",
+        encoding: str = JSON
+    ):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.encoding = encoding
+        self.socket_id = next(_socket_ids)
+        self.manager = manager
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        self.rate_limiter = RateLimiter(settings.ws_connection_rate_limits)
+        self.writer_task: Optional[asyncio.Task] = None
+        self.closed = False
+
+    def start(self):
+        self.writer_task = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, message: Union[dict, OutboundFrame]) -> bool:
+        if self.closed:
+            return False
+        if not isinstance(message, OutboundFrame):
+            message = OutboundFrame(message)
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def _write_loop(self):
+        while True:
+            frame = await self.queue.get()
+            try:
+                await asyncio.wait_for(
+                    send_frame(self.websocket, frame, self.encoding),
+                    timeout=settings.ws_send_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self.manager.evict(self, "send blocked past deadline")
+                return
+            except Exception as e:
+                self.manager.evict(self, f"send failed: {str(e)}")
+                return
+
+    def stop(self):
+        # Stop the writer without touching the socket (client already went away)
+        self.closed = True
+        if self.writer_task and self.writer_task is not asyncio.current_task():
+            self.writer_task.cancel()
+
+    async def close(self, code: int = status.WS_1013_TRY_AGAIN_LATER):
+        self.stop()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            # The socket may already be closed or half-dead
+            pass
+
 class ConnectionManager:
-    def __init__(self):
-        # Map of user_id -> WebSocket connection
-        self.active_connections: Dict[int, WebSocket] = {}
+    def __init__(self, backplane: Optional[Backplane] = None):
+        # Map of user_id -> {socket_id -> Connection}, one entry per device/tab
+        self.active_connections: Dict[int, Dict[int, Connection]] = {}
+        # Recipients may be connected to other workers, so user-addressed
+        # events go through the backplane and every worker delivers locally
+        self.backplane = backplane or InProcessBackplane()
+        self.backplane.subscribe("deliver", self.deliver_event)
+        # Sequenced replay buffers so dropped sockets can resume
+        self.sessions = SessionStore()
         
-    async def connect(self, websocket: WebSocket, user_id: int):
-        await websocket.accept()
-        self.active_connections[user_id] = websocket
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        resume_token: Optional[str] = None,
+        last_seq: Optional[int] = None
+    ) -> Connection:
+        subprotocol, encoding = negotiate(websocket)
+        await websocket.accept(subprotocol=subprotocol)
+        connection = Connection(websocket, user_id, self, encoding)
+        initial = self.initial_frames(user_id)
+        replay = None
+        if resume_token and last_seq is not None:
+            replay = self.sessions.resume(user_id, resume_token, last_seq)
+            # The session frame, the replay and the initial frames are queued
+            # at once; if they don't all fit, the fresh socket would be evicted
+            if replay is not None and 1 + len(replay) + len(initial) > connection.queue.maxsize:
+                replay = None
+        session = self.sessions.open(user_id)
+        self.active_connections.setdefault(user_id, {})[connection.socket_id] = connection
+        connection.start()
+        # Nothing is awaited between the replay and registering the socket,
+        # so live events queue up strictly after the replayed ones
+        self._enqueue(connection, {
+            "type": "session",
+            "resumeToken": session.token,
+            "lastSeq": self.sessions.seq
+        })
+        if replay is not None:
+            for frame in replay:
+                self._enqueue(connection, frame)
+        elif resume_token:
+            self._enqueue(connection, {"type": "resync_required"})
+        for frame in initial:
+            self._enqueue(connection, frame)
+        return connection
+
+    def initial_frames(self, user_id: int) -> List[dict]:
+        # Hook for subclasses: state every new socket gets after the session frame
+        return []
         
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+    def disconnect(self, connection: Connection) -> bool:
+        """Remove a single socket. Returns True if it was the user's last one."""
+        connection.stop()
+        sockets = self.active_connections.get(connection.user_id)
+        if not sockets or sockets.pop(connection.socket_id, None) is None:
+            return False
+        if sockets:
+            return False
+        del self.active_connections[connection.user_id]
+        self.sessions.release(connection.user_id)
+        return True
+
+    def evict(
+        self,
+        connection: Connection,
+        reason: str,
+        code: int = status.WS_1013_TRY_AGAIN_LATER
+    ):
+        if connection.closed:
+            return
+        logger.warning(
+            f"Evicting WebSocket for user {connection.user_id} "
+            f"(socket {connection.socket_id}): {reason}"
+        )
+        went_offline = self.disconnect(connection)
+        asyncio.create_task(connection.close(code))
+        if went_offline:
+            asyncio.create_task(self.user_went_offline(connection.user_id))
+
+    async def user_went_offline(self, user_id: int):
+        # Hook for subclasses; called when a user's last socket goes away
+        pass
+
+    def _enqueue(self, connection: Connection, message: Union[dict, OutboundFrame]):
+        if not connection.enqueue(message):
+            self.evict(connection, "outbound queue full")
+            
+    def _sequenced(self, message: dict) -> Tuple[int, OutboundFrame]:
+        # One frame per event, encoded at most once per wire format
+        seq = self.sessions.next_seq()
+        return seq, OutboundFrame({**message, "seq": seq})
+
+    def _deliver(self, seq: int, frame: OutboundFrame, user_id: int):
+        self.sessions.record(user_id, seq, frame)
+        for connection in list(self.active_connections.get(user_id, {}).values()):
+            self._enqueue(connection, frame)
             
     async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_json(message)
+        if self.sessions.has_session(user_id):
+            self._deliver(*self._sequenced(message), user_id)
+            
+    async def publish_to_users(self, message: dict, user_ids: Iterable[int]):
+        await self.backplane.publish({
+            "kind": "deliver",
+            "user_ids": list(user_ids),
+            "message": message,
+        })
+
+    async def deliver_event(self, event: dict):
+        # Users who recently dropped still have a session and get the
+        # event buffered for replay
+        user_ids = [user_id for user_id in event["user_ids"] if self.sessions.has_session(user_id)]
+        if not user_ids:
+            return
+        metrics.WS_FANOUT_RECIPIENTS.observe(len(user_ids))
+        seq, frame = self._sequenced(event["message"])
+        for user_id in user_ids:
+            self._deliver(seq, frame, user_id)
             
     async def broadcast(self, message: dict, exclude_user_id: int = None):
-        for user_id, connection in self.active_connections.items():
+        seq, frame = self._sequenced(message)
+        for user_id in list(self.active_connections):
             if exclude_user_id is None or user_id != exclude_user_id:
-                await connection.send_json(message)
+                self._deliver(seq, frame, user_id)
+                
+    def queue_depths(self) -> Dict[str, int]:
+        depths = [
+            connection.queue.qsize()
+            for sockets in self.active_connections.values()
+            for connection in sockets.values()
+        ]
+        return {"max": max(depths, default=0), "total": sum(depths)}
+
+    def socket_count(self) -> int:
+        return sum(len(sockets) for sockets in self.active_connections.values())
                 
+    def is_online(self, user_id: int) -> bool:
+        return user_id in self.active_connections
+
     def get_online_users(self) -> List[int]:
         return list(self.active_connections.keys())
 
+def message_event(message: Message) -> dict:
+    return {
+        "type": "message",
+        "message": {
+            "id": message.id,
+            "chatId": message.chat_id,
+            "senderId": message.sender_id,
+            "content": message.content,
+            "createdAt": message.created_at.isoformat(),
+            "read": message.read
+        }
+    }
+
 class WebSocketConnectionManager(ConnectionManager):
-    async def handle_message(self, data: dict, user_id: int, db: Session):
+    def __init__(self, backplane: Optional[Backplane] = None):
+        super().__init__(backplane)
+        self.ingestor = MessageIngestor(self.publish_messages, self.messages_failed)
+        self.presence = PresenceService(self)
+        # Map of user_id -> token buckets shared by all of the user's sockets
+        self.user_rate_limiters: Dict[int, RateLimiter] = {}
+        self.rate_limited: Dict[str, int] = {}
+        self.typing = Coalescer(settings.ws_typing_interval_seconds, self.publish_typing)
+    
+    async def start(self):
+        self.ingestor.start()
+        self.presence.start()
+    
+    async def stop(self):
+        await self.presence.stop()
+        await self.ingestor.stop()
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        user_id: int,
+        resume_token: Optional[str] = None,
+        last_seq: Optional[int] = None
+    ) -> Connection:
+        connection = await super().connect(websocket, user_id, resume_token, last_seq)
+        self.presence.connected(user_id)
+        return connection
+
+    def initial_frames(self, user_id: int) -> List[dict]:
+        # Bring the new socket up to date; later changes arrive as deltas
+        snapshot = self.presence.snapshot(user_id)
+        return [presence_event(snapshot)] if snapshot else []
+    
+    async def handle_message(
+        self,
+        data: dict,
+        user_id: int,
+        db: AsyncSession,
+        connection: Optional[Connection] = None
+    ):
         message_type = data.get("type")
-        
+        label = metrics.ws_event_label(message_type)
+        route = metrics.set_route(f"ws:{label}")
+        started = time.perf_counter()
+        try:
+            # Unknown types are dropped before rate limiting, so they never
+            # create buckets or counter labels of their own
+            if message_type not in metrics.WS_EVENT_TYPES:
+                logger.warning(f"Unknown message type from user {user_id}")
+                return
+            if connection is not None and not await self.admit(connection, message_type):
+                return
+            await self._dispatch(message_type, data, user_id, db)
+        finally:
+            metrics.WS_HANDLE_SECONDS.labels(label).observe(time.perf_counter() - started)
+            metrics.reset_route(route)
+    
+    async def _dispatch(self, message_type, data: dict, user_id: int, db: AsyncSession):
         if message_type == "message":
             await self.handle_chat_message(data, user_id, db)
         elif message_type == "mark_read":
             await self.handle_mark_read(data, user_id, db)
         elif message_type == "typing":
             await self.handle_typing_indicator(data, user_id)
-        elif message_type == "heartbeat":
-            # Just acknowledge heartbeats, no action needed
-            pass
-        else:
-            logger.warning(f"Unknown message type: {message_type}")
+        # "heartbeat" needs no action
     
-    async def handle_chat_message(self, data: dict, user_id: int, db: Session):
+    async def admit(self, connection: Connection, message_type: str) -> bool:
+        """Apply the per-connection and per-user token buckets for this event type."""
+        user_limiter = self.user_rate_limiters.get(connection.user_id)
+        if user_limiter is None:
+            user_limiter = RateLimiter(settings.ws_user_rate_limits)
+            self.user_rate_limiters[connection.user_id] = user_limiter
+        buckets = [
+            bucket for bucket in (
+                connection.rate_limiter.bucket(message_type),
+                user_limiter.bucket(message_type),
+            ) if bucket is not None
+        ]
+        wait = max((bucket.wait_time() for bucket in buckets), default=0.0)
+        if wait <= 0:
+            for bucket in buckets:
+                bucket.consume()
+            return True
+        
+        # Types without a limit of their own are counted under "default"
+        limited = {connection.rate_limiter.key(message_type), user_limiter.key(message_type)}
+        key = message_type if message_type in limited else "default"
+        self.rate_limited[key] = self.rate_limited.get(key, 0) + 1
+        actions = settings.ws_rate_limit_actions
+        action = actions.get(key, actions.get("default"))
+        if action == DELAY and wait <= settings.ws_rate_limit_max_delay_seconds:
+            # Holding the socket's receive loop backpressures the client
+            for bucket in buckets:
+                bucket.consume()
+            await asyncio.sleep(wait)
+            return True
+        if action in (DELAY, DISCONNECT):
+            self.evict(
+                connection,
+                f"rate limit exceeded for {message_type}",
+                code=status.WS_1008_POLICY_VIOLATION
+            )
+        return False
+    
+    async def handle_chat_message(self, data: dict, user_id: int, db: AsyncSession):
         chat_id = data.get("chatId")
         content = data.get("content")
         
         if not chat_id or not content:
             return
         
-        # Check if user is a participant in the chat
-        participant = db.query(ChatParticipant).filter(
-            ChatParticipant.chat_id == chat_id,
-            ChatParticipant.user_id == user_id
-        ).first()
+        # Same rules as POST /api/messages/, so a malformed frame is rejected
+        # here instead of failing the group commit it would have joined
+        try:
+            MessageCreate.model_validate({"chat_id": chat_id, "content": content}, strict=True)
+        except ValidationError:
+            await self.send_personal_message({
+                "type": "message_failed",
+                "chatId": chat_id if isinstance(chat_id, int) else None,
+                "detail": "chatId must be an integer and content a string"
+            }, user_id)
+            return
         
-        if not participant:
+        # Check if user is a participant in the chat
+        if not membership_index.is_member(chat_id, user_id):
             logger.warning(f"User {user_id} attempted to send message to chat {chat_id} but is not a participant")
             return
         
-        # Create and save the message
-        message = Message(
-            chat_id=chat_id,
-            sender_id=user_id,
-            content=content,
-            created_at=datetime.utcnow(),
-            read=False
-        )
-        db.add(message)
-        db.commit()
-        db.refresh(message)
-        
-        # Get chat participants to send the message to
-        participants = db.query(ChatParticipant).filter(
-            ChatParticipant.chat_id == chat_id
-        ).all()
-        
-        # Convert message to dict for sending over WebSocket
-        message_data = {
-            "type": "message",
-            "message": {
-                "id": message.id,
+        # Queue the message for the next group commit; fan-out happens
+        # in publish_messages once it has been written
+        await self.ingestor.submit(chat_id, user_id, content)
+    
+    async def publish_messages(self, messages: List[Message]):
+        for message in messages:
+            await self.publish_to_users(
+                message_event(message),
+                membership_index.members(message.chat_id)
+            )
+    
+    async def messages_failed(self, messages: List[Message]):
+        # The sender gets the content back so the client can offer a retry
+        for message in messages:
+            await self.send_personal_message({
+                "type": "message_failed",
                 "chatId": message.chat_id,
-                "senderId": message.sender_id,
                 "content": message.content,
-                "createdAt": message.created_at.isoformat(),
-                "read": message.read
-            }
-        }
-        
-        # Send to all participants
-        for participant in participants:
-            if participant.user_id in self.active_connections:
-                await self.send_personal_message(message_data, participant.user_id)
+                "detail": "Message could not be saved"
+            }, message.sender_id)
     
-    async def handle_mark_read(self, data: dict, user_id: int, db: Session):
+    async def handle_mark_read(self, data: dict, user_id: int, db: AsyncSession):
         chat_id = data.get("chatId")
         
-        if not chat_id:
+        if not chat_id or not membership_index.is_member(chat_id, user_id):
             return
         
-        # Mark all messages in the chat as read for this user
-        unread_messages = db.query(Message).filter(
-            Message.chat_id == chat_id,
-            Message.sender_id != user_id,
-            Message.read == False
-        ).all()
-        
-        for message in unread_messages:
-            message.read = True
-        
-        db.commit()
-        
-        # Notify the sender that their messages were read
-        for message in unread_messages:
-            if message.sender_id in self.active_connections:
-                await self.send_personal_message({
-                    "type": "message_read",
-                    "messageId": message.id,
-                    "chatId": chat_id,
-                    "readBy": user_id
-                }, message.sender_id)
+        # Read up to the given message, or everything currently in the chat
+        last_message_id = (await db.execute(
+            select(Chat.last_message_id).where(Chat.id == chat_id)
+        )).scalar()
+        if not last_message_id:
+            return
+        up_to_id = last_message_id
+        requested_id = data.get("messageId")
+        if isinstance(requested_id, int):
+            up_to_id = min(up_to_id, requested_id)
+        
+        participant_filter = (
+            ChatParticipant.chat_id == chat_id,
+            ChatParticipant.user_id == user_id,
+        )
+        previous_id = (await db.execute(
+            select(ChatParticipant.last_read_message_id).where(*participant_filter)
+        )).scalar() or 0
+        if up_to_id <= previous_id:
+            return
+        
+        # Advance the watermark with a single statement; it never moves back
+        result = await db.execute(
+            update(ChatParticipant)
+            .where(*participant_filter)
+            .where(or_(
+                ChatParticipant.last_read_message_id.is_(None),
+                ChatParticipant.last_read_message_id < up_to_id
+            ))
+            .values(last_read_message_id=up_to_id)
+        )
+        if result.rowcount == 0:
+            await db.rollback()
+            return
+        for statement in chat_summary.messages_read(chat_id, user_id, up_to_id, last_message_id):
+            await db.execute(statement)
+        
+        # Senders whose messages just became read get one event each
+        sender_ids = (await db.execute(
+            select(Message.sender_id).distinct().where(
+                Message.chat_id == chat_id,
+                Message.id > previous_id,
+                Message.id <= up_to_id,
+                Message.sender_id != user_id
+            )
+        )).scalars().all()
+        
+        await db.commit()
+        
+        if sender_ids:
+            await self.publish_to_users({
+                "type": "messages_read",
+                "chatId": chat_id,
+                "readBy": user_id,
+                "upToId": up_to_id
+            }, sender_ids)
     
     async def handle_typing_indicator(self, data: dict, user_id: int):
         chat_id = data.get("chatId")
         is_typing = data.get("isTyping", False)
         
-        if not chat_id:
+        if not chat_id or not membership_index.is_member(chat_id, user_id):
             return
         
+        # At most one update per chat and user per interval; the latest wins
+        await self.typing.submit((chat_id, user_id), bool(is_typing))
+    
+    async def publish_typing(self, key: Tuple[int, int], is_typing: bool):
+        chat_id, user_id = key
         # Send typing indicator to all participants in the chat
         typing_data = {
             "type": "user_typing",
@@ -148,27 +482,9 @@ class WebSocketConnectionManager(ConnectionManager):
             "isTyping": is_typing
         }
         
-        await self.broadcast(typing_data, exclude_user_id=user_id)
+        recipients = membership_index.members(chat_id) - {user_id}
+        await self.publish_to_users(typing_data, recipients)
     
-    async def broadcast_user_status(self, user_id: int, is_online: bool, db: Session):
-        # Get all chats the user is a participant in
-        participant_chats = db.query(ChatParticipant).filter(
-            ChatParticipant.user_id == user_id
-        ).all()
-        
-        # For each chat, notify other participants of the user's status
-        for participant in participant_chats:
-            chat_participants = db.query(ChatParticipant).filter(
-                ChatParticipant.chat_id == participant.chat_id,
-                ChatParticipant.user_id != user_id
-            ).all()
-            
-            status_data = {
-                "type": "status",
-                "userId": user_id,
-                "isOnline": is_online
-            }
-            
-            for chat_participant in chat_participants:
-                if chat_participant.user_id in self.active_connections:
-                    await self.send_personal_message(status_data, chat_participant.user_id)
+    async def user_went_offline(self, user_id: int):
+        self.user_rate_limiters.pop(user_id, None)
+        self.presence.disconnected(user_id)
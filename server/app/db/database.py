@@ -1,16 +1,50 @@
-
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 
+from app.db.profiles import engine_options, engine_url, install_sqlite_pragmas, resolve_profile
+
+# Storage tuning (SQLite PRAGMAs, Postgres pool and statement caching) comes
+# from the named profile in settings.storage_profile
+storage_profile = resolve_profile(
+    settings.database_url, settings.storage_profile, settings.storage_profile_overrides
+)
+
 engine = create_engine(
-    settings.database_url, 
-    connect_args={"check_same_thread": False} if settings.database_url.startswith("sqlite") else {}
+    engine_url(settings.database_url, storage_profile, is_async=False),
+    **engine_options(settings.database_url, storage_profile, is_async=False)
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def get_async_database_url(url: str) -> str:
+    # Same database, async driver: aiosqlite for SQLite, asyncpg for Postgres
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+async_database_url = get_async_database_url(settings.database_url)
+async_engine = create_async_engine(
+    engine_url(async_database_url, storage_profile, is_async=True),
+    **engine_options(async_database_url, storage_profile, is_async=True)
+)
+
+if settings.database_url.startswith("sqlite"):
+    install_sqlite_pragmas(engine, storage_profile)
+    install_sqlite_pragmas(async_engine.sync_engine, storage_profile)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -20,5 +54,49 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def create_tables():
     Base.metadata.create_all(bind=engine)
+    return sync_schema()
+
+# Timestamps compared as (value, id) row values by keyset cursors, and the
+# columns they are copied from. SQLite's CURRENT_TIMESTAMP server default
+# has no fractional seconds while SQLAlchemy writes microseconds, and the
+# two text formats don't sort in time order against each other.
+CURSOR_TIMESTAMPS = [
+    ("messages", "created_at"),
+    ("chats", "created_at"),
+    ("chat_participants", "last_activity_at"),
+]
+
+def normalize_timestamps(conn):
+    if conn.dialect.name != "sqlite":
+        return
+    for table, column in CURSOR_TIMESTAMPS:
+        conn.execute(text(
+            f"UPDATE {table} SET {column} = {column} || '.000000' WHERE length({column}) = 19"
+        ))
+
+def sync_schema():
+    # create_all() only creates missing tables, so bring existing databases
+    # up to date with columns and indexes added to the models since.
+    # Returns the "table.column" names that were added.
+    added = set()
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(
+                        f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                    ))
+                    added.add(f"{table.name}.{column.name}")
+            for index in table.indexes:
+                index.create(bind=conn, checkfirst=True)
+        normalize_timestamps(conn)
+    return added
@@ -0,0 +1,140 @@
+import time
+from typing import Any, Dict
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.core.metrics import DB_POOL_CHECKOUT_SECONDS
+
+# Named storage profiles per dialect, selected with settings.storage_profile.
+# "baseline" is the driver/SQLAlchemy defaults, kept for comparison.
+#
+# SQLite profiles are PRAGMAs run on every new connection. WAL lets readers
+# proceed during a write, busy_timeout makes writers wait for the lock
+# instead of failing with "database is locked", and synchronous=NORMAL in
+# WAL mode only fsyncs at checkpoints (a crash can lose the last commits but
+# never corrupts the database).
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "baseline": {},
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    "balanced": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -65536,        # 64 MiB
+        "mmap_size": 268435456,      # 256 MiB
+        "temp_store": "MEMORY",
+    },
+    "throughput": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 10000,
+        "cache_size": -262144,       # 256 MiB
+        "mmap_size": 1073741824,     # 1 GiB
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10000,
+    },
+}
+
+# Postgres profiles are pool options for both engines, plus statement
+# caching: query_cache_size is SQLAlchemy's compiled SQL cache and
+# prepared_statement_cache_size is asyncpg's per-connection cache.
+POSTGRES_PROFILES: Dict[str, Dict[str, Any]] = {
+    "baseline": {},
+    "durable": {
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+    },
+    "balanced": {
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 10,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "query_cache_size": 1000,
+        "prepared_statement_cache_size": 256,
+    },
+    "throughput": {
+        "pool_size": 30,
+        "max_overflow": 30,
+        "pool_timeout": 5,
+        "pool_pre_ping": False,
+        "pool_recycle": 3600,
+        "query_cache_size": 2000,
+        "prepared_statement_cache_size": 1024,
+    },
+}
+
+POOL_OPTIONS = ("pool_size", "max_overflow", "pool_timeout", "pool_pre_ping", "pool_recycle", "query_cache_size")
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+
+    engine_name = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(self.engine_name).observe(time.perf_counter() - started)
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    engine_name = "async"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(self.engine_name).observe(time.perf_counter() - started)
+
+def resolve_profile(url: str, name: str, overrides: Dict[str, Any]) -> Dict[str, Any]:
+    profiles = SQLITE_PROFILES if url.startswith("sqlite") else POSTGRES_PROFILES
+    if name not in profiles:
+        raise ValueError(f"Unknown storage profile '{name}'; choose one of: {', '.join(profiles)}")
+    return {**profiles[name], **overrides}
+
+def engine_options(url: str, profile: Dict[str, Any], is_async: bool) -> Dict[str, Any]:
+    """Keyword arguments for create_engine / create_async_engine."""
+    options: Dict[str, Any] = {}
+    if url.startswith("sqlite"):
+        if ":memory:" not in url and "mode=memory" not in url:
+            options["poolclass"] = TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool
+        if not is_async:
+            options["connect_args"] = {"check_same_thread": False}
+        return options
+    options["poolclass"] = TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool
+    for key in POOL_OPTIONS:
+        if key in profile:
+            options[key] = profile[key]
+    return options
+
+def engine_url(url: str, profile: Dict[str, Any], is_async: bool) -> str:
+    cache_size = profile.get("prepared_statement_cache_size")
+    if is_async and cache_size is not None and url.startswith("postgresql+asyncpg"):
+        return make_url(url).update_query_dict(
+            {"prepared_statement_cache_size": str(cache_size)}
+        ).render_as_string(hide_password=False)
+    return url
+
+def install_sqlite_pragmas(engine: Engine, profile: Dict[str, Any]):
+    if not profile:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma, value in profile.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+        finally:
+            cursor.close()
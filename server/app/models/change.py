@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from app.db.database import Base
+
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    __table_args__ = (
+        # Serves GET /api/sync: changes in the caller's chats after a seq
+        Index("ix_change_log_chat_seq", "chat_id", "seq"),
+        # ...plus changes addressed to the caller (removed from a chat, chat deleted)
+        Index("ix_change_log_user_seq", "user_id", "seq"),
+        # Never reuse a seq on SQLite, even after the newest rows are deleted
+        {"sqlite_autoincrement": True},
+    )
+    
+    # Global, monotonically increasing position in the log
+    seq = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    chat_id = Column(Integer, nullable=False)
+    # The member or reader the change is about, if any
+    user_id = Column(Integer, nullable=True)
+    # The message the change is about, or the read watermark
+    message_id = Column(Integer, nullable=True)
+    # JSON: the message as of this change, or the new chat name
+    data = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
@@ -1,18 +1,28 @@
-
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Table
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
 
 class ChatParticipant(Base):
     __tablename__ = "chat_participants"
+    __table_args__ = (
+        # Serves the chat list: a user's chats ordered by last activity
+        Index("ix_chat_participants_user_activity", "user_id", "last_activity_at", "chat_id"),
+    )
     
     chat_id = Column(Integer, ForeignKey("chats.id"), primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
     joined_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Read watermark: every message in the chat up to this id has been read
+    last_read_message_id = Column(Integer, nullable=True)
+    # Chat summary, maintained incrementally by app.core.chat_summary
+    unread_count = Column(Integer, default=0, server_default="0")
+    # Set in Python so every row has the same precision (cursors compare on it)
+    last_activity_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     
-    chat = relationship("Chat", back_populates="participants")
-    user = relationship("User")
+    chat = relationship("Chat", viewonly=True)
+    user = relationship("User", viewonly=True)
 
 class Chat(Base):
     __tablename__ = "chats"
@@ -20,8 +30,19 @@ class Chat(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=True)  # For group chats
     is_group = Column(Boolean, default=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # Seeds chat_participants.last_activity_at, so the same precision applies
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Chat summary, maintained incrementally by app.core.chat_summary
+    last_message_id = Column(Integer, nullable=True)
+    last_message_sender_id = Column(Integer, nullable=True)
+    last_message_preview = Column(String, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    # ETag version, bumped by app.core.versions
+    version = Column(Integer, default=0, server_default="0")
     
-    participants = relationship("ChatParticipant", back_populates="chat")
+    participants = relationship("User", secondary="chat_participants", backref="chats")
+    # The participant rows themselves, with each member's read watermark
+    members = relationship("ChatParticipant", viewonly=True)
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
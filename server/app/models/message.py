@@ -1,17 +1,24 @@
-
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Serves keyset pagination of a chat's history in (created_at, id) order
+        Index("ix_messages_chat_created_id", "chat_id", "created_at", "id"),
+        # Serves id-range scans within a chat (read watermarks, unread counts)
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     chat_id = Column(Integer, ForeignKey("chats.id"))
     sender_id = Column(Integer, ForeignKey("users.id"))
     content = Column(Text)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set in Python so every row has the same precision (cursors compare on it)
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     read = Column(Boolean, default=False)
     
     chat = relationship("Chat", back_populates="messages")
@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -13,3 +13,15 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # ETag version of this user's chat list, bumped by app.core.versions
+    chat_list_version = Column(Integer, default=0, server_default="0")
+
+class UserSearchTerm(Base):
+    """Lowercased username/email terms, tokens and suffixes, for prefix search."""
+    __tablename__ = "user_search_terms"
+    
+    term = Column(String, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True, index=True)
+    # 0 = username, 1 = email, 2 = token inside the username or email,
+    # 3 = suffix of the username or email
+    field = Column(Integer, primary_key=True)
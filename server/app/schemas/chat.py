@@ -14,6 +14,7 @@ class ChatParticipantCreate(ChatParticipantBase):
 
 class ChatParticipantResponse(ChatParticipantBase):
     joined_at: datetime
+    last_read_message_id: Optional[int] = None
     
     class Config:
         from_attributes = True
@@ -27,11 +28,15 @@ class ChatCreate(ChatBase):
 
 class ChatUpdate(BaseModel):
     name: Optional[str] = None
+    add_participant_ids: Optional[List[int]] = None
+    remove_participant_ids: Optional[List[int]] = None
 
 class ChatResponse(ChatBase):
     id: int
     created_at: datetime
     participants: List[UserResponse]
+    # Per member: last_read_message_id is their read watermark
+    members: List[ChatParticipantResponse] = []
     last_message: Optional[MessageResponse] = None
     unread_count: int = 0
     
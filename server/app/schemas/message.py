@@ -1,6 +1,6 @@
 
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 class MessageBase(BaseModel):
@@ -9,6 +9,9 @@ class MessageBase(BaseModel):
 class MessageCreate(MessageBase):
     chat_id: int
 
+class MessageBatchCreate(BaseModel):
+    messages: List[MessageCreate] = Field(..., min_length=1, max_length=100)
+
 class MessageUpdate(BaseModel):
     content: Optional[str] = None
     read: Optional[bool] = None
@@ -22,3 +25,9 @@ class MessageResponse(MessageBase):
     
     class Config:
         from_attributes = True
+
+class MessageSearchResult(BaseModel):
+    message: MessageResponse
+    # Matching fragment with hits wrapped in <mark></mark>
+    snippet: str
+    score: float
@@ -0,0 +1,19 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+class ChangeResponse(BaseModel):
+    seq: int
+    # message_created, message_edited, message_deleted, messages_read,
+    # member_added, member_removed, chat_renamed or chat_deleted
+    type: str
+    chat_id: int
+    user_id: Optional[int] = None
+    message_id: Optional[int] = None
+    # The full message for message_created/edited, {"name"} for chat_renamed
+    data: Optional[Dict[str, Any]] = None
+
+class SyncResponse(BaseModel):
+    changes: List[ChangeResponse]
+    # Pass as since on the next call
+    next: int
+    has_more: bool
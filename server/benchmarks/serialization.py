@@ -0,0 +1,131 @@
+"""Microbenchmark for list endpoint serialization.
+
+Compares the response_model path (ORM objects validated into
+MessageResponse / UserResponse, then encoded by JSONResponse) with the
+column path (tuples rendered by RowsResponse) on an in-memory SQLite
+database, timing the query and the encoding of one page separately.
+
+    cd server
+    python -m benchmarks.serialization --page-size 200 --iterations 500
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core import serialization
+from app.core.serialization import MESSAGE_COLUMNS, MESSAGE_FIELDS, USER_COLUMNS, USER_FIELDS, RowsResponse
+from app.db.database import Base
+from app.models.chat import Chat
+from app.models.message import Message
+from app.models.user import User
+from app.schemas.message import MessageResponse
+from app.schemas.user import UserResponse
+
+def seed(db, messages: int, users: int):
+    started = datetime.utcnow() - timedelta(days=1)
+    db.add_all(
+        User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x", created_at=started)
+        for i in range(users)
+    )
+    db.add(Chat(name="bench", is_group=True, created_by=1))
+    db.flush()
+    db.add_all(
+        Message(
+            chat_id=1,
+            sender_id=i % users + 1,
+            content=f"message {i} " + "lorem ipsum dolor sit amet " * 3,
+            created_at=started + timedelta(milliseconds=i),
+        )
+        for i in range(messages)
+    )
+    db.commit()
+
+def measure(fn: Callable[[], object], iterations: int) -> Dict[str, float]:
+    for _ in range(min(iterations, 20)):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        "p50_us": round(statistics.median(samples), 1),
+        "p99_us": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))], 1),
+    }
+
+def run(page_size: int, iterations: int):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    seed(db, messages=page_size * 4, users=page_size)
+
+    def message_objects() -> List[Message]:
+        db.expunge_all()
+        return (
+            db.query(Message).filter(Message.chat_id == 1)
+            .order_by(Message.created_at.desc(), Message.id.desc()).limit(page_size).all()
+        )
+
+    def message_rows():
+        return (
+            db.query(*MESSAGE_COLUMNS).filter(Message.chat_id == 1)
+            .order_by(Message.created_at.desc(), Message.id.desc()).limit(page_size).all()
+        )
+
+    def user_objects() -> List[User]:
+        db.expunge_all()
+        return db.query(User).limit(page_size).all()
+
+    def user_rows():
+        return db.query(*USER_COLUMNS).limit(page_size).all()
+
+    # What FastAPI does for response_model: validate, dump to JSON-able
+    # Python, then json.dumps in JSONResponse
+    def model_path(adapter: TypeAdapter, objects) -> bytes:
+        validated = adapter.validate_python(objects, from_attributes=True)
+        return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+    cases = [
+        ("messages", TypeAdapter(List[MessageResponse]), message_objects, message_rows, MESSAGE_FIELDS),
+        ("users", TypeAdapter(List[UserResponse]), user_objects, user_rows, USER_FIELDS),
+    ]
+    encoder = "orjson" if serialization.orjson is not None else "json"
+    print(f"page size {page_size}, {iterations} iterations, column path encoder: {encoder}")
+    print(f"{'case':<10} {'stage':<8} {'model p50':>10} {'column p50':>11} {'speedup':>8}")
+    for name, adapter, objects, rows, fields in cases:
+        loaded_objects = objects()
+        loaded_rows = rows()
+        assert len(loaded_rows) == page_size
+        stages = [
+            ("query", objects, rows),
+            ("encode", lambda: model_path(adapter, loaded_objects), lambda: RowsResponse(fields, loaded_rows).body),
+            ("total", lambda: model_path(adapter, objects()), lambda: RowsResponse(fields, rows()).body),
+        ]
+        for stage, model_fn, column_fn in stages:
+            model = measure(model_fn, iterations)
+            column = measure(column_fn, iterations)
+            speedup = model["p50_us"] / column["p50_us"]
+            print(
+                f"{name:<10} {stage:<8} {model['p50_us']:>8.0f}us {column['p50_us']:>9.0f}us {speedup:>7.1f}x"
+            )
+    db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+    run(args.page_size, args.iterations)
+
+if __name__ == "__main__":
+    main()
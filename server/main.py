@@ -1,33 +1,104 @@
 
 import logging
 import os
-from fastapi import FastAPI, Depends, HTTPException, WebSocket, WebSocketDisconnect, status
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
 from sqlalchemy.orm import Session
 
-from app.api.routes import auth, users, chats, messages
+from app.api.routes import auth, users, chats, messages, sync
 from app.core.config import Settings
-from app.db.database import get_db, create_tables
-from app.core.auth import get_current_user
+from app.db.database import get_db, create_tables, engine, SessionLocal, AsyncSessionLocal, async_engine
+from app.core.auth import get_current_user_async, auth_cache_stats
+from app.core.passwords import password_hasher
+from app.core.backplane import RESUBSCRIBED, backplane
 from app.core.websocket import WebSocketConnectionManager
+from app.core.chat_summary import SUMMARY_COLUMNS, rebuild_chat_summaries
+from app.core.membership import membership_index
+from app.core.framing import receive_frame
+from app.core import metrics
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.archive import archive_store, archiver
+from app.core.search import search_index
+from app.core.user_search import ensure_user_search
 from app.core.logger import setup_logging
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 # Setup logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
 # Create WebSocket connection manager
-ws_manager = WebSocketConnectionManager()
+ws_manager = WebSocketConnectionManager(backplane)
+backplane.subscribe("membership", membership_index.apply_event)
+backplane.subscribe(RESUBSCRIBED, membership_index.reload)
+
+# Metrics: DB statements on both engines, plus gauges read at scrape time
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+metrics.scrape_collector.gauge(
+    "ws_active_connections", "Open WebSocket connections", ws_manager.socket_count
+)
+metrics.scrape_collector.gauge(
+    "ws_online_users", "Users with at least one open WebSocket", lambda: len(ws_manager.active_connections)
+)
+metrics.scrape_collector.gauge(
+    "ws_send_queue_depth", "Frames waiting in per-socket send queues", ws_manager.queue_depths, label="stat"
+)
+metrics.scrape_collector.gauge(
+    "ws_rate_limited_events", "Inbound events over their rate limit, by type", lambda: ws_manager.rate_limited, label="type"
+)
+metrics.scrape_collector.gauge(
+    "message_ingest_queue_depth", "Messages waiting for group commit", lambda: ws_manager.ingestor.queue.qsize()
+)
+metrics.scrape_collector.gauge(
+    "auth_cache_hit_rate",
+    "Hit rate of the auth token and user identity caches",
+    lambda: {name: stats["hit_rate"] for name, stats in auth_cache_stats().items()},
+    label="cache",
+)
+metrics.scrape_collector.gauge(
+    "password_hash_pending", "bcrypt jobs queued or running", lambda: password_hasher.pending
+)
+metrics.scrape_collector.gauge(
+    "db_pool_checked_out",
+    "Connections currently checked out of each pool",
+    lambda: {"sync": engine.pool.checkedout(), "async": async_engine.pool.checkedout()},
+    label="engine",
+)
+metrics.scrape_collector.gauge(
+    "event_loop_lag_last_seconds", "Most recent event-loop lag sample", lambda: metrics.loop_lag_monitor.last_lag
+)
 
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up server and initializing database...")
-    create_tables()
+    added_columns = create_tables()
+    search_index.create(engine)
+    db = SessionLocal()
+    try:
+        if added_columns & SUMMARY_COLUMNS:
+            logger.info("Backfilling chat summaries...")
+            rebuild_chat_summaries(db)
+        ensure_user_search(db)
+        membership_index.load(db)
+    finally:
+        db.close()
+    await backplane.start()
+    await ws_manager.start()
+    password_hasher.start()
+    metrics.loop_lag_monitor.start()
+    archiver.start()
     yield
     logger.info("Shutting down server...")
+    await archiver.stop()
+    await metrics.loop_lag_monitor.stop()
+    password_hasher.stop()
+    await ws_manager.stop()
+    await backplane.stop()
+    await async_engine.dispose()
 
 # Create FastAPI app
 app = FastAPI(
@@ -47,23 +118,44 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
+@app.middleware("http")
+async def label_db_metrics(request: Request, call_next):
+    # DB metrics read the matched route from the scope once routing is done
+    route = metrics.set_route(request.scope)
+    try:
+        return await call_next(request)
+    finally:
+        metrics.reset_route(route)
+
 # Include API routes
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
 app.include_router(chats.router, prefix="/api/chats", tags=["Chats"])
 app.include_router(messages.router, prefix="/api/messages", tags=["Messages"])
+app.include_router(sync.router, prefix="/api/sync", tags=["Sync"])
 
 @app.get("/api/health")
 def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "storage_profile": settings.storage_profile,
+        "auth_cache": auth_cache_stats(),
+        "password_hashing": password_hasher.stats(),
+        "presence": ws_manager.presence.stats(),
+        "sessions": ws_manager.sessions.stats(),
+        "rate_limited": ws_manager.rate_limited,
+        "archive": {**archive_store.stats(), "archived": archiver.archived},
+    }
+
+@app.get("/api/metrics")
+async def metrics_endpoint():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.websocket("/ws")
-async def websocket_endpoint(
-    websocket: WebSocket,
-    db: Session = Depends(get_db)
-):
+async def websocket_endpoint(websocket: WebSocket):
     token = websocket.query_params.get("token")
     if not token:
         await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
@@ -71,21 +163,33 @@ async def websocket_endpoint(
     
     try:
         # Authenticate the WebSocket connection
-        user = get_current_user(token=token, db=db)
+        async with AsyncSessionLocal() as db:
+            user = await get_current_user_async(token=token, db=db)
         user_id = user.id
         
-        await ws_manager.connect(websocket, user_id)
-        logger.info(f"User {user_id} connected to WebSocket")
+        # Reconnecting clients pass their resume token and the last seq seen
+        resume_token = websocket.query_params.get("resume")
+        last_seq = websocket.query_params.get("lastSeq")
+        connection = await ws_manager.connect(
+            websocket,
+            user_id,
+            resume_token=resume_token,
+            last_seq=int(last_seq) if last_seq and last_seq.isdigit() else None
+        )
+        logger.info(f"User {user_id} connected to WebSocket (socket {connection.socket_id})")
         
         try:
             while True:
-                data = await websocket.receive_json()
-                await ws_manager.handle_message(data, user_id, db)
+                data = await receive_frame(websocket)
+                # Short-lived session per frame; all DB I/O is awaited
+                async with AsyncSessionLocal() as db:
+                    await ws_manager.handle_message(data, user_id, db, connection)
         except WebSocketDisconnect:
-            logger.info(f"User {user_id} disconnected from WebSocket")
-            ws_manager.disconnect(user_id)
-            # Notify other users about the disconnect
-            await ws_manager.broadcast_user_status(user_id, False, db)
+            logger.info(f"User {user_id} disconnected socket {connection.socket_id} from WebSocket")
+        finally:
+            # Only the user's last open socket takes them offline
+            if ws_manager.disconnect(connection):
+                await ws_manager.user_went_offline(user_id)
         
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
@@ -98,4 +202,5 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True if os.getenv("ENVIRONMENT") == "development" else False,
+        ws_per_message_deflate=settings.ws_per_message_deflate,
     )
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.database import Base
+# Every model, so mappers configure and create_all sees every table
+from app.models import change, chat, message  # noqa: F401
+from app.models.user import User
+
+class FakeWebSocket:
+    """Accepts the handshake and records every frame sent and the close code.
+
+    Sends wait while `stalled` is set, like a client that stopped reading.
+    """
+
+    def __init__(self, subprotocols=(), stalled=False):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.subprotocol = None
+        self.sent = []
+        self.closed_with = None
+        self.stalled = stalled
+
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, data):
+        await self._send(data)
+
+    async def send_bytes(self, data):
+        await self._send(data)
+
+    async def _send(self, data):
+        while self.stalled:
+            await asyncio.sleep(0.01)
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+@pytest.fixture
+def fake_websocket():
+    # The class itself, since most tests open several sockets
+    return FakeWebSocket
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+@pytest.fixture
+def add_users(db):
+    """Adds users u1..uN (ids 1..N on a fresh database) and returns them."""
+    def add(count):
+        users = [User(username=f"u{n}", email=f"u{n}@example.com", hashed_password="x") for n in range(1, count + 1)]
+        db.add_all(users)
+        db.commit()
+        return users
+    return add
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from app.api.routes import messages
+from app.core import archive
+from app.core.archive import ArchiveStore
+from app.core.membership import MembershipIndex
+from app.core.search import search_index
+from app.core.serialization import MessageRow
+from app.models.chat import Chat, ChatParticipant
+from app.models.message import Message
+from app.models.user import User
+
+STARTED = datetime(2024, 1, 1)
+
+def _messages(chat_id, first_id, count):
+    return [
+        MessageRow(f"message {n}", n, chat_id, 1, STARTED + timedelta(minutes=n), True)
+        for n in range(first_id, first_id + count)
+    ]
+
+def test_stores_see_segments_written_by_another_worker(tmp_path):
+    ours, theirs = ArchiveStore(str(tmp_path)), ArchiveStore(str(tmp_path))
+    assert ours.chat(1).last_key is None
+    theirs.append(1, _messages(1, 1, 3))
+    # Our cached (empty) listing must neither hide nor overwrite their segment
+    assert ours.chat(1).last_key == (STARTED + timedelta(minutes=3), 3)
+    ours.append(1, _messages(1, 4, 3))
+    assert sorted(p.name for p in (tmp_path / "1").iterdir()) == ["00000001.seg", "00000002.seg"]
+    assert [message.id for message in theirs.chat(1).page_before(None, 10)] == [6, 5, 4, 3, 2, 1]
+
+def test_remove_chat_keeps_other_chats_cached(tmp_path):
+    store = ArchiveStore(str(tmp_path))
+    store.append(1, _messages(1, 1, 3))
+    store.append(2, _messages(2, 4, 3))
+    store.chat(1).page_before(None, 10)
+    store.chat(2).page_before(None, 10)
+    store.remove_chat(1)
+    assert store.chat(1).segments == []
+    hits = store.blocks.hits
+    store.chat(2).page_before(None, 10)
+    assert store.blocks.hits == hits + 1
+
+def test_search_finds_archived_messages(db, engine, add_users, monkeypatch, tmp_path):
+    add_users(2)
+    store = ArchiveStore(str(tmp_path))
+    monkeypatch.setattr(archive, "archive_store", store)
+    monkeypatch.setattr(messages, "archive_store", store)
+    index = MembershipIndex()
+    index.add_chat(1, [1, 2])
+    monkeypatch.setattr(messages, "membership_index", index)
+    search_index.create(engine)
+    db.add(Chat(id=1, name="old", is_group=False, created_by=1))
+    db.add_all([ChatParticipant(chat_id=1, user_id=1), ChatParticipant(chat_id=1, user_id=2)])
+    old = [
+        Message(chat_id=1, sender_id=1, content=content, created_at=STARTED + timedelta(minutes=n))
+        for n, content in enumerate(["the lighthouse keeper", "nothing here"])
+    ]
+    db.add_all(old)
+    db.flush()
+    for statement in search_index.messages_indexed(old):
+        db.execute(statement)
+    db.commit()
+    lighthouse_id = old[0].id
+
+    assert archive.archive_chat(db, 1, STARTED + timedelta(days=1)) == 2
+    assert db.query(Message).count() == 0
+    results = messages.search_messages(
+        messages.Response(), q="lighthouse", chat_id=1, cursor=None, limit=20, db=db, current_user=db.get(User, 2)
+    )
+    assert [(result.message.id, result.message.content) for result in results] == [(lighthouse_id, "the lighthouse keeper")]
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core import websocket
+from app.core.membership import MembershipIndex
+from app.core.websocket import WebSocketConnectionManager
+from app.db.database import Base, get_async_database_url
+from app.models.chat import Chat, ChatParticipant
+from app.models.message import Message
+from app.models.user import User
+
+def test_async_url_uses_the_async_driver_for_the_same_database():
+    assert get_async_database_url("sqlite:///./chat.db") == "sqlite+aiosqlite:///./chat.db"
+    assert get_async_database_url("postgresql://u:p@db/chat") == "postgresql+asyncpg://u:p@db/chat"
+    assert get_async_database_url("postgres://u:p@db/chat") == "postgresql+asyncpg://u:p@db/chat"
+
+def test_mark_read_runs_on_an_async_session(tmp_path, fake_websocket, monkeypatch):
+    url = f"sqlite:///{tmp_path}/chat.db"
+    sync_engine = create_engine(url)
+    Base.metadata.create_all(sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [
+            {"id": n, "username": f"u{n}", "email": f"u{n}@example.com", "hashed_password": "x"} for n in (1, 2)
+        ])
+        conn.execute(Chat.__table__.insert(), [{"id": 1, "name": "chat", "is_group": False, "created_by": 1, "last_message_id": 2}])
+        conn.execute(ChatParticipant.__table__.insert(), [
+            {"chat_id": 1, "user_id": 1, "unread_count": 0}, {"chat_id": 1, "user_id": 2, "unread_count": 2}
+        ])
+        conn.execute(Message.__table__.insert(), [
+            {"id": n, "chat_id": 1, "sender_id": 1, "content": f"m{n}"} for n in (1, 2)
+        ])
+    sync_engine.dispose()
+    index = MembershipIndex()
+    index.add_chat(1, [1, 2])
+    monkeypatch.setattr(websocket, "membership_index", index)
+
+    async def run():
+        async_engine = create_async_engine(get_async_database_url(url))
+        manager = WebSocketConnectionManager()
+        sender = fake_websocket()
+        await manager.connect(sender, user_id=1)
+        async with async_sessionmaker(async_engine, class_=AsyncSession)() as db:
+            await manager.handle_mark_read({"chatId": 1}, 2, db)
+            row = (await db.execute(
+                select(ChatParticipant.last_read_message_id, ChatParticipant.unread_count)
+                .where(ChatParticipant.chat_id == 1, ChatParticipant.user_id == 2)
+            )).one()
+        await asyncio.sleep(0.01)
+        await async_engine.dispose()
+        return tuple(row), [json.loads(data) for data in sender.sent]
+
+    row, events = asyncio.run(run())
+    assert row == (2, 0)
+    assert [event for event in events if event["type"] == "messages_read"][0]["upToId"] == 2
@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import event
+
+from app.core import auth
+from app.core.auth import create_access_token, get_current_user
+from app.models.user import User
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+    yield
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+
+def _count_queries(engine):
+    queries = []
+    event.listen(engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+    return queries
+
+def test_cached_identity_skips_the_users_table(db, engine, add_users):
+    add_users(1)
+    token = create_access_token({"sub": "1"})
+    assert get_current_user(token, db).username == "u1"
+    db.expunge_all()
+    queries = _count_queries(engine)
+    user = get_current_user(token, db)
+    assert user.id == 1 and user.username == "u1"
+    assert queries == []
+
+def test_committed_user_changes_drop_the_cached_identity(db, add_users):
+    add_users(1)
+    token = create_access_token({"sub": "1"})
+    get_current_user(token, db)
+    db.get(User, 1).is_active = False
+    db.commit()
+    assert auth.user_cache.get(1) is None
+    with pytest.raises(auth.HTTPException) as error:
+        get_current_user(token, db)
+    assert error.value.status_code == 401
+
+def test_invalid_tokens_are_not_cached(db):
+    with pytest.raises(auth.HTTPException):
+        get_current_user("not-a-token", db)
+    assert auth.token_cache.get("not-a-token") is None
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from app.core.backplane import RESUBSCRIBED, RedisBackplane
+from app.core.config import settings
+
+fakeredis = pytest.importorskip("fakeredis")
+
+def _backplane(server):
+    backplane = RedisBackplane("redis://localhost:6379/0")
+    backplane.redis = fakeredis.aioredis.FakeRedis(server=server)
+    return backplane
+
+async def _until(condition, timeout=2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("timed out")
+
+def _recording(backplane):
+    received = []
+
+    async def handler(event):
+        received.append(event["n"])
+
+    backplane.subscribe("test", handler)
+    return received
+
+def test_events_reach_other_workers_once():
+    async def run():
+        server = fakeredis.FakeServer()
+        sender, receiver = _backplane(server), _backplane(server)
+        sent, received = _recording(sender), _recording(receiver)
+        await sender.start()
+        await receiver.start()
+        await sender.publish({"kind": "test", "n": 1})
+        await _until(lambda: received == [1])
+        await asyncio.sleep(0.05)
+        await sender.stop()
+        await receiver.stop()
+        return sent, received
+
+    assert asyncio.run(run()) == ([1], [1])
+
+def test_listener_resubscribes_after_disconnect(monkeypatch):
+    monkeypatch.setattr(settings, "backplane_reconnect_min_seconds", 0.01)
+
+    async def run():
+        server = fakeredis.FakeServer()
+        sender, receiver = _backplane(server), _backplane(server)
+        received = _recording(receiver)
+        resubscribed = []
+
+        async def on_resubscribed(event):
+            resubscribed.append(event)
+
+        receiver.subscribe(RESUBSCRIBED, on_resubscribed)
+        await sender.start()
+        await receiver.start()
+        assert resubscribed == []
+        server.connected = False
+        await _until(lambda: receiver.pubsub is None)
+        server.connected = True
+        await _until(lambda: receiver.pubsub is not None and receiver.pubsub.subscribed)
+        await sender.publish({"kind": "test", "n": 2})
+        await _until(lambda: received == [2])
+        assert not receiver.listener.done()
+        assert resubscribed == [{"kind": RESUBSCRIBED}]
+        await sender.stop()
+        await receiver.stop()
+
+    asyncio.run(run())
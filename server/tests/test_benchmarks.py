@@ -0,0 +1,25 @@
+import json
+
+from benchmarks.load import compare, flatten, percentiles
+
+def test_percentiles():
+    assert percentiles([]) == {"count": 0, "p50": None, "p99": None, "p999": None, "max": None}
+    summary = percentiles([float(n) for n in range(1000, 0, -1)])
+    assert summary == {"count": 1000, "p50": 501.0, "p99": 991.0, "p999": 1000.0, "max": 1000.0}
+
+def test_flatten_keeps_numbers_and_skips_the_config():
+    result = {
+        "config": {"users": 10},
+        "commit": "abc123",
+        "ws": {"latency_ms": {"p50": 1.5, "p99": None}, "sent": 10, "ok": True},
+    }
+    assert flatten(result) == {"ws.latency_ms.p50": 1.5, "ws.sent": 10}
+
+def test_compare_prints_the_change_of_shared_metrics(tmp_path, capsys):
+    old, new = tmp_path / "old.json", tmp_path / "new.json"
+    old.write_text(json.dumps({"rest": {"p50": 2.0, "gone": 1}}))
+    new.write_text(json.dumps({"rest": {"p50": 1.0}}))
+    compare(str(old), str(new))
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert lines[1].split() == ["rest.p50", "2.0", "1.0", "-50.0%"]
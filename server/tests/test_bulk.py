@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.api.routes import messages, users
+from app.core.membership import MembershipIndex
+from app.core.search import search_index
+from app.models.chat import Chat, ChatParticipant
+from app.models.message import Message
+from app.models.user import User
+from app.schemas.message import MessageBatchCreate
+
+@pytest.fixture
+def db(db, engine, add_users, monkeypatch):
+    add_users(3)
+    search_index.create(engine)
+    db.add_all([Chat(id=1, name="a", is_group=False, created_by=1), Chat(id=2, name="b", is_group=False, created_by=1)])
+    db.add_all([ChatParticipant(chat_id=1, user_id=1), ChatParticipant(chat_id=2, user_id=1), ChatParticipant(chat_id=2, user_id=2)])
+    db.commit()
+    index = MembershipIndex()
+    index.add_chat(1, [1])
+    index.add_chat(2, [1, 2])
+    monkeypatch.setattr(messages, "membership_index", index)
+    return db
+
+def _batch(*chat_ids):
+    return MessageBatchCreate(messages=[{"chat_id": chat_id, "content": f"to {chat_id}"} for chat_id in chat_ids])
+
+def test_batch_sends_to_several_chats_at_once(db):
+    rows = messages.create_messages(_batch(1, 2, 2), db=db, current_user=db.get(User, 1))
+    assert [(row.chat_id, row.content) for row in rows] == [(1, "to 1"), (2, "to 2"), (2, "to 2")]
+    assert db.get(Chat, 2).last_message_id == rows[-1].id
+    assert db.query(ChatParticipant.unread_count).filter_by(chat_id=2, user_id=2).scalar() == 2
+
+def test_batch_is_rejected_as_a_whole(db):
+    with pytest.raises(messages.HTTPException) as error:
+        messages.create_messages(_batch(2, 1), db=db, current_user=db.get(User, 2))
+    assert error.value.status_code == 403
+    with pytest.raises(messages.HTTPException) as error:
+        messages.create_messages(_batch(1, 9), db=db, current_user=db.get(User, 1))
+    assert error.value.status_code == 404
+    assert db.query(Message).count() == 0
+
+def _lookup(db, ids):
+    response = users.get_users(ids=ids, db=db, current_user=db.get(User, 1))
+    return [user["id"] for user in json.loads(response.body)]
+
+def test_users_are_looked_up_in_the_requested_order(db):
+    assert _lookup(db, "3,1,99,3") == [3, 1]
+    assert _lookup(db, "") == []
+    with pytest.raises(users.HTTPException) as error:
+        _lookup(db, "1,two")
+    assert error.value.status_code == 400
+    with pytest.raises(users.HTTPException) as error:
+        _lookup(db, ",".join(str(n) for n in range(users.MAX_LOOKUP_IDS + 1)))
+    assert error.value.status_code == 400
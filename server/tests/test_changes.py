@@ -0,0 +1,18 @@
+from sqlalchemy.dialects import postgresql
+
+from app.core import changes
+
+def _sql(statements):
+    return [str(statement.compile(dialect=postgresql.dialect())) for statement in statements]
+
+def test_postgres_appends_hold_the_append_lock(monkeypatch):
+    monkeypatch.setattr(changes, "SERIALIZE_APPENDS", True)
+    for statements in (changes.messages_read(1, 2, 3), changes.chat_deleted(1)):
+        first, *rest = _sql(statements)
+        assert "pg_advisory_xact_lock" in first
+        assert all(sql.startswith("INSERT INTO change_log") for sql in rest)
+    assert changes.members_added(1, []) == []
+
+def test_sqlite_appends_take_no_lock(monkeypatch):
+    monkeypatch.setattr(changes, "SERIALIZE_APPENDS", False)
+    assert len(changes.messages_read(1, 2, 3)) == 1
@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import event, text
+
+from app.api.routes import chats
+from app.core.archive import ArchiveStore
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.search import search_index
+from app.db.database import normalize_timestamps
+from app.models.chat import Chat, ChatParticipant
+from app.models.user import User
+from app.schemas.chat import ChatCreate, ChatUpdate
+
+@pytest.fixture
+def db(db, add_users, monkeypatch):
+    add_users(3)
+    db.add(Chat(name="chat", is_group=True, created_by=1))
+    db.flush()
+    db.add_all([ChatParticipant(chat_id=1, user_id=1), ChatParticipant(chat_id=1, user_id=2)])
+    db.commit()
+    monkeypatch.setattr(chats, "publish_membership_change", lambda *args: None)
+    return db
+
+def _members(db):
+    return sorted(user_id for (user_id,) in db.query(ChatParticipant.user_id).filter(ChatParticipant.chat_id == 1))
+
+def test_update_chat_checks_membership_in_the_database(db):
+    caller = db.get(User, 1)
+    chats.update_chat(1, ChatUpdate(add_participant_ids=[2, 3, 3]), db=db, current_user=caller)
+    assert _members(db) == [1, 2, 3]
+    chats.update_chat(1, ChatUpdate(remove_participant_ids=[3]), db=db, current_user=caller)
+    assert _members(db) == [1, 2]
+
+def test_update_chat_rejects_non_members(db):
+    with pytest.raises(chats.HTTPException) as error:
+        chats.update_chat(1, ChatUpdate(name="x"), db=db, current_user=db.get(User, 3))
+    assert error.value.status_code == 403
+
+def _request():
+    return chats.Request({"type": "http", "method": "GET", "headers": []})
+
+def test_get_chat_checks_membership_in_the_database(db):
+    response = chats.Response()
+    chat = chats.get_chat(1, _request(), response, db=db, current_user=db.get(User, 2))
+    assert chat.id == 1 and "ETag" in response.headers
+    with pytest.raises(chats.HTTPException) as error:
+        chats.get_chat(1, _request(), chats.Response(), db=db, current_user=db.get(User, 3))
+    assert error.value.status_code == 403
+    with pytest.raises(chats.HTTPException) as error:
+        chats.get_chat(2, _request(), chats.Response(), db=db, current_user=db.get(User, 2))
+    assert error.value.status_code == 404
+
+def _walk_chat_list(db, user, limit=1):
+    chat_ids, cursor = [], None
+    for _ in range(20):
+        response = chats.Response()
+        page = chats.get_user_chats(_request(), response, cursor=cursor, limit=limit, db=db, current_user=user)
+        chat_ids += [chat.id for chat in page]
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return chat_ids
+    raise AssertionError(f"chat list did not end: {chat_ids}")
+
+def test_chat_list_pages_end(db):
+    caller = db.get(User, 1)
+    for _ in range(3):
+        chats.create_chat(ChatCreate(participant_ids=[2]), db=db, current_user=caller)
+    assert sorted(_walk_chat_list(db, caller)) == [1, 2, 3, 4]
+
+def test_chat_list_pages_end_over_server_default_timestamps(db, engine):
+    # Rows written before last_activity_at was set in Python
+    with engine.begin() as conn:
+        for chat_id in (2, 3):
+            conn.execute(text(f"INSERT INTO chats (id, name, is_group, created_by) VALUES ({chat_id}, 'old', 0, 1)"))
+            conn.execute(text(f"INSERT INTO chat_participants (chat_id, user_id) VALUES ({chat_id}, 1)"))
+        normalize_timestamps(conn)
+    assert sorted(_walk_chat_list(db, db.get(User, 1))) == [1, 2, 3]
+
+def test_delete_chat_locks_the_chat_row_first(db, engine, monkeypatch, tmp_path):
+    search_index.create(engine)
+    monkeypatch.setattr(chats, "archive_store", ArchiveStore(str(tmp_path)))
+    caller = db.get(User, 1)
+    statements = []
+    event.listen(db, "do_orm_execute", lambda state: statements.append(state.statement))
+    chats.delete_chat(1, db=db, current_user=caller)
+    assert statements[0]._for_update_arg is not None
+    assert statements[0].get_final_froms()[0].name == "chats"
+    assert db.get(Chat, 1) is None
@@ -0,0 +1,38 @@
+import asyncio
+import json
+
+from app.core.websocket import ConnectionManager
+
+def _events(websocket):
+    return [json.loads(data) for data in websocket.sent]
+
+def test_every_socket_of_a_user_gets_their_events(fake_websocket):
+    async def run():
+        manager = ConnectionManager()
+        phone, laptop = fake_websocket(), fake_websocket()
+        await manager.connect(phone, user_id=1)
+        await manager.connect(laptop, user_id=1)
+        await manager.send_personal_message({"type": "event"}, 1)
+        await asyncio.sleep(0.01)
+        return manager, phone, laptop
+
+    manager, phone, laptop = asyncio.run(run())
+    assert manager.socket_count() == 2 and manager.get_online_users() == [1]
+    for websocket in (phone, laptop):
+        assert [event["type"] for event in _events(websocket)] == ["session", "event"]
+
+def test_user_stays_online_until_their_last_socket_leaves(fake_websocket):
+    async def run():
+        manager = ConnectionManager()
+        first = await manager.connect(fake_websocket(), user_id=1)
+        second = await manager.connect(fake_websocket(), user_id=1)
+        went_offline = [manager.disconnect(first)]
+        online = manager.is_online(1)
+        went_offline.append(manager.disconnect(second))
+        # A socket that is already gone does not count twice
+        went_offline.append(manager.disconnect(second))
+        return manager, went_offline, online
+
+    manager, went_offline, online = asyncio.run(run())
+    assert online and went_offline == [False, True, False]
+    assert not manager.is_online(1) and manager.socket_count() == 0
@@ -0,0 +1,38 @@
+import asyncio
+
+from app.core.config import settings
+from app.core.websocket import ConnectionManager
+
+def test_full_queue_evicts_only_the_slow_socket(fake_websocket, monkeypatch):
+    monkeypatch.setattr(settings, "ws_send_queue_size", 4)
+
+    async def run():
+        manager = ConnectionManager()
+        slow, fast = fake_websocket(stalled=True), fake_websocket()
+        await manager.connect(slow, user_id=1)
+        await manager.connect(fast, user_id=2)
+        for n in range(10):
+            await manager.broadcast({"type": "event", "n": n})
+            # Let the writers run, as the event loop would between events
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        return manager, slow, fast
+
+    manager, slow, fast = asyncio.run(run())
+    assert slow.closed_with == 1013
+    assert manager.get_online_users() == [2]
+    assert fast.closed_with is None and len(fast.sent) == 11
+
+def test_send_past_deadline_evicts_the_socket(fake_websocket, monkeypatch):
+    monkeypatch.setattr(settings, "ws_send_timeout_seconds", 0.05)
+
+    async def run():
+        manager = ConnectionManager()
+        websocket = fake_websocket(stalled=True)
+        await manager.connect(websocket, user_id=1)
+        await asyncio.sleep(0.2)
+        return manager, websocket
+
+    manager, websocket = asyncio.run(run())
+    assert websocket.closed_with == 1013
+    assert not manager.is_online(1)
@@ -0,0 +1,40 @@
+import asyncio
+import json
+
+import msgpack
+
+from app.core import framing
+from app.core.framing import JSON, MSGPACK, OutboundFrame, negotiate
+from app.core.websocket import ConnectionManager
+
+def test_negotiate_prefers_the_client_order_and_falls_back_to_json(fake_websocket, monkeypatch):
+    assert negotiate(fake_websocket(["messenger.msgpack", "messenger.json"])) == ("messenger.msgpack", MSGPACK)
+    assert negotiate(fake_websocket(["chat.v2", "messenger.json"])) == ("messenger.json", JSON)
+    assert negotiate(fake_websocket()) == (None, JSON)
+    monkeypatch.setattr(framing, "msgpack", None)
+    assert negotiate(fake_websocket(["messenger.msgpack"])) == (None, JSON)
+
+def test_frames_are_encoded_once_per_encoding(monkeypatch):
+    calls = []
+    encode = framing.encode
+    monkeypatch.setattr(framing, "encode", lambda message, encoding: calls.append(encoding) or encode(message, encoding))
+    frame = OutboundFrame({"type": "event", "text": "héllo"})
+    for _ in range(3):
+        assert frame.encode(JSON) == '{"type":"event","text":"héllo"}'
+        assert msgpack.unpackb(frame.encode(MSGPACK)) == {"type": "event", "text": "héllo"}
+    assert calls == [JSON, MSGPACK]
+
+def test_each_socket_gets_its_negotiated_encoding(fake_websocket):
+    async def run():
+        manager = ConnectionManager()
+        text, binary = fake_websocket(), fake_websocket(["messenger.msgpack"])
+        await manager.connect(text, user_id=1)
+        await manager.connect(binary, user_id=2)
+        await manager.broadcast({"type": "event"})
+        await asyncio.sleep(0.01)
+        return text, binary
+
+    text, binary = asyncio.run(run())
+    assert binary.subprotocol == "messenger.msgpack" and text.subprotocol is None
+    assert json.loads(text.sent[-1])["type"] == "event"
+    assert msgpack.unpackb(binary.sent[-1])["type"] == "event"
@@ -0,0 +1,49 @@
+import asyncio
+
+from app.core.ingest import MessageIngestor
+from app.core.websocket import WebSocketConnectionManager
+
+class RecordingIngestor(MessageIngestor):
+    """Writes nothing; a batch holding a "bad" message fails as a whole."""
+
+    def __init__(self):
+        self.committed = []
+        self.failed = []
+
+        async def on_committed(messages):
+            self.committed.extend(messages)
+
+        async def on_failed(messages):
+            self.failed.extend(messages)
+
+        super().__init__(on_committed, on_failed)
+
+    async def _write(self, batch):
+        if any(message.content == "bad" for message in batch):
+            raise RuntimeError("constraint failed")
+
+async def _flush(contents):
+    ingestor = RecordingIngestor()
+    for n, content in enumerate(contents):
+        await ingestor.submit(chat_id=1, sender_id=n + 1, content=content)
+    batch = [ingestor.queue.get_nowait() for _ in contents]
+    await ingestor._flush(batch)
+    return ingestor
+
+def test_failed_batch_is_retried_per_message():
+    ingestor = asyncio.run(_flush(["hello", "bad", "world"]))
+    assert [message.content for message in ingestor.committed] == ["hello", "world"]
+    assert [(message.sender_id, message.content) for message in ingestor.failed] == [(2, "bad")]
+
+def test_malformed_message_is_rejected_before_ingest(fake_websocket):
+    async def run():
+        manager = WebSocketConnectionManager()
+        websocket = fake_websocket()
+        await manager.connect(websocket, user_id=1)
+        await manager.handle_chat_message({"chatId": 1, "content": ["not", "text"]}, 1, db=None)
+        await asyncio.sleep(0.05)
+        return manager, websocket
+
+    manager, websocket = asyncio.run(run())
+    assert manager.ingestor.queue.empty()
+    assert '"message_failed"' in websocket.sent[-1]
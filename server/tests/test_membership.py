@@ -0,0 +1,26 @@
+import asyncio
+
+from sqlalchemy.orm import sessionmaker
+
+from app.core.membership import MembershipIndex
+from app.db import database
+from app.models.chat import Chat, ChatParticipant
+
+def test_reload_catches_up_with_missed_changes(db, engine, add_users, monkeypatch):
+    add_users(2)
+    db.add(Chat(name="chat", created_by=1))
+    db.flush()
+    db.add(ChatParticipant(chat_id=1, user_id=1))
+    db.commit()
+    index = MembershipIndex()
+    index.load(db)
+
+    # Made on another worker while this one's backplane was down
+    db.add(ChatParticipant(chat_id=1, user_id=2))
+    db.commit()
+    assert not index.is_member(1, 2)
+
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine))
+    asyncio.run(index.reload({"kind": "resubscribed"}))
+    assert index.is_member(1, 2)
+    assert index.chats_of(2) == {1}
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+from sqlalchemy import text
+
+from app.api.routes import chats, messages
+from app.core import chat_summary
+from app.core.archive import ArchiveStore
+from app.core.membership import MembershipIndex
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.db.database import normalize_timestamps
+from app.models.user import User
+
+@pytest.fixture
+def db(db, engine, add_users, monkeypatch, tmp_path):
+    add_users(2)
+    # Rows as written before created_at was set in Python: all in the same
+    # second, in CURRENT_TIMESTAMP's format
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO chats (id, name, is_group, created_by) VALUES (1, 'old', 0, 1)"))
+        conn.execute(text("INSERT INTO chat_participants (chat_id, user_id) VALUES (1, 1), (1, 2)"))
+        for n in range(1, 6):
+            conn.execute(text(f"INSERT INTO messages (chat_id, sender_id, content) VALUES (1, 1, 'm{n}')"))
+        normalize_timestamps(conn)
+    index = MembershipIndex()
+    index.add_chat(1, [1, 2])
+    monkeypatch.setattr(messages, "membership_index", index)
+    monkeypatch.setattr(messages, "archive_store", ArchiveStore(str(tmp_path)))
+    return db
+
+def _page(db, **params):
+    request = messages.Request({"type": "http", "method": "GET", "headers": []})
+    params.setdefault("before_id", None)
+    params.setdefault("after_id", None)
+    params.setdefault("cursor", None)
+    params.setdefault("limit", 50)
+    response = messages.get_chat_messages(1, request, db=db, current_user=db.get(User, 2), **params)
+    return [message["id"] for message in json.loads(response.body)], response.headers.get(NEXT_CURSOR_HEADER)
+
+def test_history_pages_end(db):
+    message_ids, cursor = [], None
+    for _ in range(10):
+        page, cursor = _page(db, cursor=cursor, limit=1)
+        message_ids += page
+        if cursor is None:
+            break
+    assert message_ids == [5, 4, 3, 2, 1]
+
+def test_before_and_after_exclude_the_anchor(db):
+    assert _page(db, before_id=3)[0] == [2, 1]
+    assert _page(db, after_id=3)[0] == [4, 5]
+
+def test_read_follows_the_watermarks(db):
+    def flags():
+        response = messages.get_chat_messages(
+            1, messages.Request({"type": "http", "method": "GET", "headers": []}),
+            before_id=None, after_id=None, cursor=None, limit=50, db=db, current_user=db.get(User, 2)
+        )
+        return {message["id"]: message["read"] for message in json.loads(response.body)}
+    chat_summary.rebuild_chat_summaries(db)
+    assert not any(flags().values())
+    # The sender's own watermark does not make their messages read
+    for statement in chat_summary.messages_read(1, 1, 5, 5):
+        db.execute(statement)
+    db.execute(text("UPDATE chat_participants SET last_read_message_id = 5 WHERE user_id = 1"))
+    db.commit()
+    assert not any(flags().values())
+    db.execute(text("UPDATE chat_participants SET last_read_message_id = 3 WHERE user_id = 2"))
+    for statement in chat_summary.messages_read(1, 2, 3, 5):
+        db.execute(statement)
+    db.commit()
+    assert flags() == {5: False, 4: False, 3: True, 2: True, 1: True}
+    assert messages.get_message(3, db=db, current_user=db.get(User, 2)).read
+
+    request = chats.Request({"type": "http", "method": "GET", "headers": []})
+    chat = chats.get_chat(1, request, chats.Response(), db=db, current_user=db.get(User, 1))
+    assert {member.user_id: member.last_read_message_id for member in chat.members} == {1: 5, 2: 3}
+    assert chat.last_message.id == 5 and not chat.last_message.read
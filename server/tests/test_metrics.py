@@ -0,0 +1,52 @@
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest
+from sqlalchemy import create_engine, text
+
+from app.core import metrics
+from app.core.metrics import ScrapeCollector
+
+def test_statements_are_counted_by_route():
+    engine = create_engine("sqlite://")
+    metrics.instrument_engine(engine)
+    sample = lambda: REGISTRY.get_sample_value("db_queries_total", {"route": "test:route"}) or 0
+    before = sample()
+    token = metrics.set_route("test:route")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+    finally:
+        metrics.reset_route(token)
+    assert sample() == before + 2
+    assert metrics.current_route() == "background"
+
+def test_http_routes_are_labelled_by_endpoint_name():
+    def get_chat():
+        pass
+    scope = {"type": "http"}
+    token = metrics.set_route(scope)
+    try:
+        assert metrics.current_route() == "unmatched"
+        # The router fills the endpoint in after the middleware ran
+        scope["endpoint"] = get_chat
+        assert metrics.current_route() == "get_chat"
+    finally:
+        metrics.reset_route(token)
+
+def test_ws_event_labels_are_bounded():
+    assert metrics.ws_event_label("message") == "message"
+    assert metrics.ws_event_label("made-up") == "other"
+    assert metrics.ws_event_label(None) == "other"
+
+def test_scrape_gauges_are_computed_on_collect():
+    registry = CollectorRegistry()
+    collector = ScrapeCollector()
+    calls = []
+    collector.gauge("test_sockets", "Open sockets", lambda: calls.append(1) or 3)
+    collector.gauge("test_queue_depth", "Queue depth", lambda: {"max": 2, "total": 5}, label="stat")
+    collector.gauge("test_broken", "Always fails", lambda: 1 / 0)
+    registry.register(collector)
+    assert calls == []
+    output = generate_latest(registry).decode()
+    assert "test_sockets 3.0" in output
+    assert 'test_queue_depth{stat="total"} 5.0' in output
+    assert "test_broken" not in output
@@ -0,0 +1,54 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import passwords
+from app.core.config import settings
+from app.core.passwords import PasswordHasher
+
+@pytest.fixture
+def hasher(monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_workers", 0)
+    monkeypatch.setattr(settings, "bcrypt_rounds", 4)
+    monkeypatch.setattr(passwords, "_pwd_context", None)
+    hasher = PasswordHasher()
+    yield hasher
+    hasher.stop()
+
+def test_hash_and_verify(hasher):
+    async def run():
+        hashed = await hasher.hash("secret")
+        return hashed, await hasher.verify("secret", hashed), await hasher.verify("wrong", hashed)
+
+    hashed, good, bad = asyncio.run(run())
+    assert hashed.startswith("$2") and good == (True, None) and bad == (False, None)
+    assert hasher.stats()["completed"] == 3
+
+def test_hashes_at_another_cost_are_upgraded(hasher, monkeypatch):
+    hashed = asyncio.run(hasher.hash("secret"))
+    monkeypatch.setattr(settings, "bcrypt_rounds", 5)
+    monkeypatch.setattr(passwords, "_pwd_context", None)
+    valid, new_hash = asyncio.run(hasher.verify("secret", hashed))
+    assert valid and new_hash.startswith("$2b$05$")
+    assert hasher.rehashed == 1
+
+def test_full_queue_is_rejected_with_retry_after(hasher, monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_max_pending", 1)
+    release = threading.Event()
+
+    async def run():
+        busy = asyncio.create_task(hasher._run(release.wait))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(HTTPException) as error:
+                await hasher.hash("secret")
+        finally:
+            release.set()
+            await busy
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 503 and "Retry-After" in error.headers
+    assert hasher.rejected == 1 and hasher.pending == 0
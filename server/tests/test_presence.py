@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import pytest
+
+from app.core import presence
+from app.core.config import settings
+from app.core.membership import MembershipIndex
+from app.core.websocket import WebSocketConnectionManager
+
+@pytest.fixture(autouse=True)
+def contacts(monkeypatch):
+    # User 1 shares a chat with users 2 and 3
+    index = MembershipIndex()
+    index.add_chat(1, [1, 2, 3])
+    monkeypatch.setattr(presence, "membership_index", index)
+    monkeypatch.setattr(settings, "presence_offline_grace_seconds", 0.05)
+
+def _presence_updates(websocket):
+    frames = [json.loads(data) for data in websocket.sent]
+    return [frame["updates"] for frame in frames if frame["type"] == "presence"]
+
+async def _leave(manager, connection):
+    if manager.disconnect(connection):
+        await manager.user_went_offline(connection.user_id)
+
+def test_changes_within_an_interval_arrive_in_one_frame(fake_websocket):
+    async def run():
+        manager = WebSocketConnectionManager()
+        watcher = fake_websocket()
+        await manager.connect(watcher, user_id=1)
+        await manager.presence.flush()
+        await manager.connect(fake_websocket(), user_id=2)
+        await manager.connect(fake_websocket(), user_id=3)
+        await manager.presence.flush()
+        await asyncio.sleep(0.01)
+        return watcher
+
+    updates = _presence_updates(asyncio.run(run()))
+    assert len(updates) == 1
+    assert sorted(update["userId"] for update in updates[0]) == [2, 3]
+    assert all(update["isOnline"] for update in updates[0])
+
+def test_reconnecting_within_the_grace_period_does_not_flap(fake_websocket):
+    async def run():
+        manager = WebSocketConnectionManager()
+        watcher = fake_websocket()
+        await manager.connect(watcher, user_id=1)
+        connection = await manager.connect(fake_websocket(), user_id=2)
+        await manager.presence.flush()
+        await _leave(manager, connection)
+        await manager.presence.flush()
+        await manager.connect(fake_websocket(), user_id=2)
+        await asyncio.sleep(0.1)
+        await manager.presence.flush()
+        await asyncio.sleep(0.01)
+        return watcher
+
+    updates = _presence_updates(asyncio.run(run()))
+    assert updates == [[{"userId": 2, "isOnline": True}]]
+
+def test_offline_after_the_grace_period_with_last_seen(fake_websocket):
+    async def run():
+        manager = WebSocketConnectionManager()
+        watcher = fake_websocket()
+        await manager.connect(watcher, user_id=1)
+        connection = await manager.connect(fake_websocket(), user_id=2)
+        await manager.presence.flush()
+        await _leave(manager, connection)
+        await asyncio.sleep(0.1)
+        await manager.presence.flush()
+        await asyncio.sleep(0.01)
+        return manager, watcher
+
+    manager, watcher = asyncio.run(run())
+    offline = _presence_updates(watcher)[-1]
+    assert offline[0]["userId"] == 2 and not offline[0]["isOnline"] and offline[0]["lastSeen"]
+    assert not manager.presence.is_online(2)
@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.db.profiles import (
+    TimedQueuePool, engine_options, engine_url, install_sqlite_pragmas, resolve_profile
+)
+
+POSTGRES = "postgresql+asyncpg://chat:secret@db/chat"
+
+def test_resolve_profile_applies_overrides():
+    profile = resolve_profile("sqlite:///./chat.db", "balanced", {"busy_timeout": 1})
+    assert profile["journal_mode"] == "WAL" and profile["busy_timeout"] == 1
+    assert resolve_profile(POSTGRES, "baseline", {}) == {}
+    with pytest.raises(ValueError, match="Unknown storage profile"):
+        resolve_profile(POSTGRES, "fastest", {})
+
+def test_postgres_options_come_from_the_profile():
+    profile = resolve_profile(POSTGRES, "throughput", {})
+    options = engine_options(POSTGRES, profile, is_async=True)
+    assert options["pool_size"] == 30 and options["query_cache_size"] == 2000
+    assert "prepared_statement_cache_size" not in options
+    url = engine_url(POSTGRES, profile, is_async=True)
+    assert url == POSTGRES + "?prepared_statement_cache_size=1024"
+    assert engine_url(POSTGRES, profile, is_async=False) == POSTGRES
+
+def test_sqlite_pragmas_are_set_on_every_connection(tmp_path):
+    url = f"sqlite:///{tmp_path}/chat.db"
+    profile = resolve_profile(url, "balanced", {})
+    options = engine_options(url, profile, is_async=False)
+    assert options["poolclass"] is TimedQueuePool
+    engine = create_engine(url, **options)
+    install_sqlite_pragmas(engine, profile)
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    engine.dispose()
@@ -0,0 +1,40 @@
+import asyncio
+
+from app.core.ratelimit import Coalescer, RateLimiter
+from app.core.websocket import WebSocketConnectionManager
+
+def test_unlisted_types_share_the_default_bucket():
+    limiter = RateLimiter({"message": [1, 1], "default": [1, 1]})
+    assert limiter.bucket("heartbeat") is limiter.bucket("anything")
+    assert limiter.bucket("message") is not limiter.bucket("heartbeat")
+    assert set(limiter.buckets) == {"message", "default"}
+
+def test_unknown_types_are_rejected_before_rate_limiting(fake_websocket):
+    async def run():
+        manager = WebSocketConnectionManager()
+        connection = await manager.connect(fake_websocket(), user_id=1)
+        for n in range(100):
+            await manager.handle_message({"type": f"junk{n}"}, 1, db=None, connection=connection)
+        return manager, connection
+
+    manager, connection = asyncio.run(run())
+    assert connection.rate_limiter.buckets == {}
+    assert manager.rate_limited == {}
+
+def test_coalescer_keeps_timer_sends_referenced():
+    async def run():
+        sent = []
+
+        async def send(key, value):
+            sent.append((key, value))
+
+        coalescer = Coalescer(0.01, send)
+        await coalescer.submit("chat", 1)
+        await coalescer.submit("chat", 2)
+        assert not coalescer._tasks
+        await asyncio.sleep(0.05)
+        return sent, coalescer
+
+    sent, coalescer = asyncio.run(run())
+    assert sent == [("chat", 1), ("chat", 2)]
+    assert not coalescer._tasks
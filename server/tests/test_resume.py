@@ -0,0 +1,67 @@
+import asyncio
+
+from app.core.config import settings
+from app.core import presence
+from app.core.membership import MembershipIndex
+from app.core.websocket import ConnectionManager, WebSocketConnectionManager
+
+async def _resume_after(fake_websocket, missed: int):
+    manager = ConnectionManager()
+    first = await manager.connect(fake_websocket(), user_id=1)
+    token = manager.sessions.sessions[1].token
+    last_seq = manager.sessions.seq
+    manager.disconnect(first)
+    for n in range(missed):
+        await manager.send_personal_message({"type": "event", "n": n}, 1)
+
+    websocket = fake_websocket()
+    connection = await manager.connect(websocket, user_id=1, resume_token=token, last_seq=last_seq)
+    await asyncio.sleep(0.05)
+    return manager, connection, websocket
+
+def test_resume_replays_missed_events(fake_websocket):
+    manager, connection, websocket = asyncio.run(_resume_after(fake_websocket, 10))
+    assert websocket.closed_with is None
+    assert len(websocket.sent) == 11
+    assert '"n":9' in websocket.sent[-1]
+
+def test_resume_larger_than_send_queue_needs_resync(fake_websocket):
+    missed = settings.ws_send_queue_size + 50
+    assert missed <= settings.ws_replay_buffer_size
+    manager, connection, websocket = asyncio.run(_resume_after(fake_websocket, missed))
+    assert websocket.closed_with is None
+    assert not connection.closed
+    assert len(websocket.sent) == 2
+    assert '"resync_required"' in websocket.sent[1]
+
+def _resume_with_presence(fake_websocket, missed: int):
+    async def run():
+        manager = WebSocketConnectionManager()
+        first = await manager.connect(fake_websocket(), user_id=1)
+        token = manager.sessions.sessions[1].token
+        last_seq = manager.sessions.seq
+        manager.disconnect(first)
+        for n in range(missed):
+            await manager.send_personal_message({"type": "event", "n": n}, 1)
+        # A contact is online, so the new socket also gets a presence snapshot
+        manager.presence.online_workers[2] = {"worker"}
+        websocket = fake_websocket()
+        connection = await manager.connect(websocket, user_id=1, resume_token=token, last_seq=last_seq)
+        await asyncio.sleep(0.05)
+        return connection, websocket
+
+    return asyncio.run(run())
+
+def test_resume_counts_the_session_and_presence_frames(fake_websocket, monkeypatch):
+    index = MembershipIndex()
+    index.add_chat(1, [1, 2])
+    monkeypatch.setattr(presence, "membership_index", index)
+    monkeypatch.setattr(settings, "ws_send_queue_size", 8)
+
+    connection, websocket = _resume_with_presence(fake_websocket, 6)
+    assert not connection.closed and websocket.closed_with is None
+    assert len(websocket.sent) == 8 and '"presence"' in websocket.sent[-1]
+
+    connection, websocket = _resume_with_presence(fake_websocket, 7)
+    assert not connection.closed and websocket.closed_with is None
+    assert ['"resync_required"' in frame or '"presence"' in frame for frame in websocket.sent[1:]] == [True, True]
@@ -0,0 +1,72 @@
+import pytest
+
+from app.api.routes import messages
+from app.core.membership import MembershipIndex
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.search import search_index
+from app.models.chat import Chat, ChatParticipant
+from app.models.message import Message
+from app.models.user import User
+
+@pytest.fixture
+def db(db, engine, add_users, monkeypatch):
+    add_users(2)
+    search_index.create(engine)
+    db.add_all([Chat(id=1, name="ours", is_group=False, created_by=1), Chat(id=2, name="theirs", is_group=False, created_by=1)])
+    db.add_all([ChatParticipant(chat_id=1, user_id=1), ChatParticipant(chat_id=1, user_id=2), ChatParticipant(chat_id=2, user_id=1)])
+    index = MembershipIndex()
+    index.add_chat(1, [1, 2])
+    index.add_chat(2, [1])
+    monkeypatch.setattr(messages, "membership_index", index)
+    return db
+
+def _add(db, chat_id, *contents):
+    added = [Message(chat_id=chat_id, sender_id=1, content=content) for content in contents]
+    db.add_all(added)
+    db.flush()
+    for statement in search_index.messages_indexed(added):
+        db.execute(statement)
+    db.commit()
+    return added
+
+def _search(db, q, user_id=2, **params):
+    response = messages.Response()
+    params.setdefault("chat_id", None)
+    params.setdefault("cursor", None)
+    params.setdefault("limit", 20)
+    results = messages.search_messages(response, q=q, db=db, current_user=db.get(User, user_id), **params)
+    return [result.message.content for result in results], response.headers.get(NEXT_CURSOR_HEADER)
+
+def test_search_matches_every_term_and_prefixes_the_last(db):
+    _add(db, 1, "deploy the release tonight", "release notes", "deployment done")
+    _add(db, 2, "secret release plans")
+    assert _search(db, "release")[0] == ["release notes", "deploy the release tonight"]
+    assert sorted(_search(db, "deploy")[0]) == ["deploy the release tonight", "deployment done"]
+    assert _search(db, "release deploy")[0] == ["deploy the release tonight"]
+    assert _search(db, "notes deploy")[0] == []
+    # Chats the caller is not in never match
+    assert "secret release plans" not in _search(db, "secret")[0]
+
+def test_edits_and_deletes_update_the_index(db):
+    message, = _add(db, 1, "lunch at noon")
+    message.content = "dinner at eight"
+    db.flush()
+    for statement in search_index.message_edited(message):
+        db.execute(statement)
+    db.commit()
+    assert _search(db, "lunch")[0] == []
+    assert _search(db, "dinner")[0] == ["dinner at eight"]
+    for statement in search_index.messages_deleted([message.id]):
+        db.execute(statement)
+    db.commit()
+    assert _search(db, "dinner")[0] == []
+
+def test_results_page_with_a_cursor(db):
+    _add(db, 1, *[f"standup {n}" for n in range(5)])
+    seen, cursor = [], None
+    for _ in range(5):
+        page, cursor = _search(db, "standup", limit=2, cursor=cursor)
+        seen += page
+        if cursor is None:
+            break
+    assert sorted(seen) == [f"standup {n}" for n in range(5)]
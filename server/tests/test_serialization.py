@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.core import serialization
+from app.core.serialization import MESSAGE_COLUMNS, MESSAGE_FIELDS, USER_COLUMNS, USER_FIELDS, MessageRow, RowsResponse
+from app.models.chat import Chat
+from app.models.message import Message
+from app.schemas.message import MessageResponse
+from app.schemas.user import UserResponse
+
+MESSAGES = [
+    MessageRow("plain", 1, 1, 1, datetime(2024, 1, 1, 10, 0, 0), False),
+    MessageRow("ünïcode \"quoted\" ✓", 2, 1, 2, datetime(2024, 1, 1, 10, 0, 0, 123456), True),
+    MessageRow("aware", 3, 1, 1, datetime(2024, 1, 1, 10, 0, 0, 500, tzinfo=timezone.utc), False),
+]
+
+def _response_model_body(model, rows):
+    # What FastAPI renders for the same rows through response_model
+    return JSONResponse(jsonable_encoder([model.model_validate(row._asdict()) for row in rows])).body
+
+@pytest.mark.parametrize("fast_json", [True, False])
+def test_rows_render_like_the_response_model(fast_json, monkeypatch):
+    if not fast_json:
+        monkeypatch.setattr(serialization, "orjson", None)
+    assert RowsResponse(MESSAGE_FIELDS, MESSAGES).body == _response_model_body(MessageResponse, MESSAGES)
+
+def test_column_rows_match_the_orm_path(db, add_users):
+    add_users(2)
+    db.add(Chat(id=1, name="chat", is_group=False, created_by=1))
+    db.add(Message(chat_id=1, sender_id=2, content="hi", created_at=datetime(2024, 1, 1, 9, 30, 0, 42)))
+    db.commit()
+    rows = db.query(*MESSAGE_COLUMNS).all()
+    assert RowsResponse(MESSAGE_FIELDS, rows).body == _response_model_body(MessageResponse, rows)
+    users = db.query(*USER_COLUMNS).order_by(USER_COLUMNS[2]).all()
+    assert RowsResponse(USER_FIELDS, users).body == _response_model_body(UserResponse, users)
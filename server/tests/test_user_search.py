@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import event
+
+from app.core.user_search import rebuild_user_search, search_user_ids
+from app.models.user import User
+
+@pytest.fixture
+def db(db):
+    for username, email in [("me", "me@x.com"), ("john", "j@x.com"), ("ohara", "o@x.com"), ("pct", "100%@x.com")]:
+        db.add(User(username=username, email=email, hashed_password="x"))
+    db.commit()
+    rebuild_user_search(db)
+    return db
+
+def test_substring_matches_rank_after_prefix_matches(db):
+    assert search_user_ids(db, "oh", current_user_id=1, limit=10) == [3, 2]
+
+def test_substring_tier_escapes_like_wildcards(db):
+    assert search_user_ids(db, "0%", current_user_id=1, limit=10) == [4]
+    assert search_user_ids(db, "_", current_user_id=1, limit=10) == []
+
+def test_substring_matches_come_from_the_term_index(db, engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+    assert search_user_ids(db, "hara", current_user_id=1, limit=10) == [3]
+    assert statements and all("user_search_terms" in sql and "LIKE" not in sql.upper() for sql in statements)
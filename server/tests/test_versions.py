@@ -0,0 +1,40 @@
+import pytest
+
+from app.core import chat_summary, versions
+from app.models.chat import Chat, ChatParticipant
+from app.models.user import User
+
+@pytest.fixture
+def db(db, add_users):
+    add_users(2)
+    db.add_all([Chat(name="one", created_by=1), Chat(name="two", created_by=2)])
+    db.flush()
+    db.add_all([
+        ChatParticipant(chat_id=1, user_id=1, unread_count=2),
+        ChatParticipant(chat_id=1, user_id=2),
+        ChatParticipant(chat_id=2, user_id=2),
+    ])
+    db.commit()
+    return db
+
+def _run(db, statements):
+    for statement in statements:
+        db.execute(statement)
+    db.commit()
+
+def test_chat_changes_leave_user_rows_alone(db):
+    _run(db, versions.chats_changed([1]))
+    assert [version for (version,) in db.query(User.chat_list_version)] == [0, 0]
+
+def test_list_etag_follows_chats_reads_and_membership(db):
+    tags = [versions.list_etag(db, 1)]
+    _run(db, versions.chats_changed([2]))
+    assert versions.list_etag(db, 1) == tags[-1]
+    for statements in (
+        versions.chats_changed([1]),
+        chat_summary.messages_read(1, 1, up_to_id=5, last_message_id=5),
+        versions.chat_lists_changed([1]),
+    ):
+        _run(db, statements)
+        tags.append(versions.list_etag(db, 1))
+    assert len(set(tags)) == len(tags)